@@ -1,5 +1,6 @@
-import express, { text } from 'express';
-import { Builder, Browser, By, until, WebElement, locateWith } from "selenium-webdriver";
+import express from 'express';
+import { By, until, WebDriver, WebElement } from "selenium-webdriver";
+import { BrowserPool } from "./browserPool";
 
 const app = express();
 const port = 3000;
@@ -8,80 +9,88 @@ const LINK_BR_FARES = "https://www.brfares.com/";
 
 const WALK_UP_STANDARD_ID = "tclass-0-1-div"
 
+// Warm browsers that have already dismissed the consent dialog, shared by all requests
+const browserPool = new BrowserPool(LINK_BR_FARES);
+
 // Returns a JS object: { "TicketName": {"TicketType: "Return/Single", "Adult": "Price", "Child": "Price"}}
+// Throws if no browser is free in time or the browser itself failed; that browser is then replaced.
 async function getFareInfo(originStation: string, destinationStation: string) {
-  let driver: Builder = await new Builder().forBrowser(Browser.CHROME).build();
+  return browserPool.withBrowser((driver) => queryFares(driver, originStation, destinationStation));
+}
+
+async function queryFares(driver: WebDriver, originStation: string, destinationStation: string) {
   const journeyData = {}
 
+  // The pooled browser was left on the previous results, so start from a fresh form
+  await driver.get(LINK_BR_FARES);
+
+  const OriginField: WebElement = await driver.findElement(By.id("origin"));
+  const DestinationField: WebElement = await driver.findElement(By.id("destination"));
+  const QueryFaresButton: WebElement = await driver.findElement(By.css("#queryparams > table > tbody > tr:nth-child(5) > td > input[type=submit]:nth-child(3)"));
+
+  // Submit Journey Data
+  await OriginField.clear();
+  await OriginField.sendKeys(originStation);
+  await DestinationField.clear();
+  await DestinationField.sendKeys(destinationStation);
+  await QueryFaresButton.click();
+
+  // Pulling Info from the query results
   try {
-    await driver.manage().setTimeouts({ implicit: 2000 });
-    await driver.get(LINK_BR_FARES);
-
-    // Appears over the content the first time you open the site.
-    const PersonalDataConsentButton = await driver.findElement(By.css("body > div.fc-consent-root > div.fc-dialog-container > div.fc-dialog.fc-choice-dialog > div.fc-footer-buttons-container > div.fc-footer-buttons > button.fc-button.fc-cta-consent.fc-primary-button"));
-
-    const OriginField: WebElement = await driver.findElement(By.id("origin"));
-    const DestinationField: WebElement = await driver.findElement(By.id("destination"));
-    const QueryFaresButton: WebElement = await driver.findElement(By.css("#queryparams > table > tbody > tr:nth-child(5) > td > input[type=submit]:nth-child(3)"));
-
-    // Submit Journey Data
-    await PersonalDataConsentButton.click();
-    await OriginField.sendKeys(originStation);
-    await DestinationField.sendKeys(destinationStation);
-    await QueryFaresButton.click();
-
-    // Pulling Info from the query results
-    try {
-      await driver.wait(until.elementLocated(By.id(WALK_UP_STANDARD_ID)), 5000);
-      const StandardFareTable: WebElement = await driver.findElement(By.id(WALK_UP_STANDARD_ID));
-      const FareRowsData: WebElement[] = await StandardFareTable.findElements(By.tagName("tr"));
-
-      for (let i=0; i<FareRowsData.length; i++){
-        let textValue = await FareRowsData[i].getText();
-        if (textValue.includes("£")) {
-          // ANYTIME RETURN, OFF-PEAK R etc
-          const ticketName = await FareRowsData[i].findElement(By.tagName("a")).findElement(By.tagName("strong")).getText();
-
-          if (!journeyData[ticketName]){
-            const ticketType = getTicketType(ticketName);
-            if (!ticketType){
-              continue;
-            }
-
-            journeyData[ticketName] = {TicketType: ticketType, Adult: "505.50"}
-            
-            const ticketFor = await FareRowsData[i].findElements(By.className("tiny"));
-
-            for (let adultChild of ticketFor){
-              // Gets the parent of an element
-              let priceForAgeGroup = await adultChild.findElement(By.xpath("./.."));
-              const ticketPricingData: string = await priceForAgeGroup.getText();
-              const ticketPricing: string[] = ticketPricingData.split("\n")
-              journeyData[ticketName][ticketPricing[0]] = ticketPricing[1];
-            }
+    await driver.wait(until.elementLocated(By.id(WALK_UP_STANDARD_ID)), 5000);
+    const StandardFareTable: WebElement = await driver.findElement(By.id(WALK_UP_STANDARD_ID));
+    const FareRowsData: WebElement[] = await StandardFareTable.findElements(By.tagName("tr"));
+
+    for (let i=0; i<FareRowsData.length; i++){
+      const textValue = await FareRowsData[i].getText();
+      if (textValue.includes("£")) {
+        // ANYTIME RETURN, OFF-PEAK R etc
+        const ticketName = await FareRowsData[i].findElement(By.tagName("a")).findElement(By.tagName("strong")).getText();
+
+        if (!journeyData[ticketName]){
+          const ticketType = getTicketType(ticketName);
+          if (!ticketType){
+            continue;
+          }
+
+          journeyData[ticketName] = {TicketType: ticketType, Adult: "505.50"}
+        
+          const ticketFor = await FareRowsData[i].findElements(By.className("tiny"));
+
+          for (const adultChild of ticketFor){
+            // Gets the parent of an element
+            const priceForAgeGroup = await adultChild.findElement(By.xpath("./.."));
+            const ticketPricingData: string = await priceForAgeGroup.getText();
+            const ticketPricing: string[] = ticketPricingData.split("\n")
+            journeyData[ticketName][ticketPricing[0]] = ticketPricing[1];
           }
         }
       }
-    } catch (e) {
-      console.log("Standard fare table not found.");
-      // Optionally return a message or empty result
-      await driver.quit();
-      return { error: "No fare table found for this journey." };
     }
-  } catch (err) {
-    console.log(err);
+  } catch {
+    console.log("Standard fare table not found.");
+    // The browser is fine, only this journey has no fare table
+    return { error: "No fare table found for this journey." };
   }
 
-  await driver.quit();
-
   return journeyData;
 }
 
 app.get('/', async (req, res) => {
-  const ticketInfo = await getFareInfo(`${req.query.originStation}`, `${req.query.destinationStation}`);
+  let ticketInfo = {};
+  try {
+    ticketInfo = await getFareInfo(`${req.query.originStation}`, `${req.query.destinationStation}`);
+  } catch (err) {
+    console.log(err);
+  }
   res.send(ticketInfo);
 });
 
+// Browser pool usage: warm, busy and queued browsers, recycles and failed health checks
+app.get('/pool', (req, res) => {
+  res.send(browserPool.stats());
+});
+
 const getTicketType = (ticketName: string)=>{
   const ticketType: string[] = ticketName.split(" ");
   if (ticketType[1].toLowerCase().match("r") ){
@@ -94,5 +103,14 @@ const getTicketType = (ticketName: string)=>{
 }
 
 app.listen(port, () => {
+  browserPool.warmUp();
+  browserPool.startHealthChecks();
   return console.log(`Express is listening at http://localhost:${port}`);
 });
+
+// Quit the pooled browsers with the server so no Chrome processes are left behind
+for (const signal of ["SIGINT", "SIGTERM"]) {
+  process.on(signal, () => {
+    browserPool.close().then(() => process.exit(0));
+  });
+}
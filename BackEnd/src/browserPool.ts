@@ -0,0 +1,253 @@
+import { Builder, Browser, By, WebDriver } from "selenium-webdriver";
+
+// A positive whole number from the environment, or the default; anything else stops the server at start-up
+const envInteger = (name: string, fallback: number): number => {
+  const raw = process.env[name];
+  if (raw === undefined || raw.trim() === "") {
+    return fallback;
+  }
+  const value = Number(raw);
+  if (!Number.isInteger(value) || value <= 0) {
+    throw new Error(`${name} must be a positive whole number, got "${raw}"`);
+  }
+  return value;
+}
+
+// Warm browsers kept open; the chatbot's FARE_MAX_CONCURRENCY should match this
+const POOL_SIZE = envInteger("BROWSER_POOL_SIZE", 2);
+// A browser is quit and replaced after this many lookups, before leaks build up
+const MAX_USES = envInteger("BROWSER_MAX_USES", 50);
+// A lookup waiting for a free browser gives up after this long, and one that runs longer than
+// LOOKUP_TIMEOUT_MS gets its browser replaced; together they stay under the chatbot's FARE_TIMEOUT_SECONDS (15s)
+const MAX_WAIT_MS = envInteger("BROWSER_MAX_WAIT_MS", 5000);
+const LOOKUP_TIMEOUT_MS = envInteger("BROWSER_LOOKUP_TIMEOUT_MS", 9000);
+// Idle browsers are checked this often, and replaced if they don't answer within HEALTH_TIMEOUT_MS
+const HEALTH_CHECK_MS = envInteger("BROWSER_HEALTH_CHECK_MS", 60000);
+const HEALTH_TIMEOUT_MS = envInteger("BROWSER_HEALTH_TIMEOUT_MS", 5000);
+
+const CONSENT_BUTTON = "body > div.fc-consent-root > div.fc-dialog-container > div.fc-dialog.fc-choice-dialog > div.fc-footer-buttons-container > div.fc-footer-buttons > button.fc-button.fc-cta-consent.fc-primary-button";
+
+interface PooledBrowser {
+  driver: WebDriver;
+  uses: number;
+  createdAt: number;
+}
+
+interface Waiter {
+  resolve: (browser: PooledBrowser) => void;
+  reject: (err: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+const withTimeout = <T>(promise: Promise<T>, ms: number, message: string): Promise<T> => {
+  let timer: NodeJS.Timeout;
+  const timeout = new Promise<never>((_, reject) => {
+    timer = setTimeout(() => reject(new Error(message)), ms);
+  });
+  return Promise.race([promise, timeout]).then(
+    (value) => { clearTimeout(timer); return value; },
+    (err) => { clearTimeout(timer); throw err; }
+  );
+}
+
+// Chrome sessions that have already opened the fares site and dismissed its consent dialog.
+// Lookups check one out, use it, and hand it back; a lookup that throws or runs too long gets its browser replaced.
+export class BrowserPool {
+  private idle: PooledBrowser[] = [];
+  private waiters: Waiter[] = [];
+  // Browsers alive or starting, idle or checked out
+  private live = 0;
+  // Every driver not yet quit, wherever it is, and the drivers still being built, so close() can quit them all
+  private drivers = new Set<WebDriver>();
+  private starting = new Set<Promise<WebDriver>>();
+  private healthTimer: NodeJS.Timeout | null = null;
+  private closed = false;
+  readonly counts = { created: 0, createFailures: 0, checkouts: 0, queued: 0, waitTimeouts: 0, lookupTimeouts: 0, recycled: 0, broken: 0, unhealthy: 0 };
+
+  constructor(private url: string, readonly size = POOL_SIZE, readonly maxUses = MAX_USES, readonly maxWaitMs = MAX_WAIT_MS,
+              readonly lookupTimeoutMs = LOOKUP_TIMEOUT_MS) {}
+
+  // Quit a driver once, however many paths (a failed lookup, close()) reach it
+  private quit(driver: WebDriver): Promise<void> {
+    if (!this.drivers.delete(driver)) {
+      return Promise.resolve();
+    }
+    return driver.quit().catch((err) => console.log("Could not quit browser:", err.message));
+  }
+
+  private async create(): Promise<PooledBrowser> {
+    const building: Promise<WebDriver> = Promise.resolve(new Builder().forBrowser(Browser.CHROME).build());
+    this.starting.add(building);
+    let driver: WebDriver;
+    try {
+      driver = await building;
+    } finally {
+      this.starting.delete(building);
+    }
+    this.drivers.add(driver);
+    if (this.closed) {
+      await this.quit(driver);
+      throw new Error("Browser pool is closed");
+    }
+    try {
+      await driver.manage().setTimeouts({ implicit: 2000 });
+      await driver.get(this.url);
+      // Appears over the content the first time you open the site; the choice is remembered by the browser after that.
+      const consentButtons = await driver.findElements(By.css(CONSENT_BUTTON));
+      if (consentButtons.length) {
+        await consentButtons[0].click();
+      }
+    } catch (err) {
+      await this.quit(driver);
+      throw err;
+    }
+    this.counts.created++;
+    return { driver, uses: 0, createdAt: Date.now() };
+  }
+
+  private destroy(browser: PooledBrowser) {
+    this.live--;
+    this.quit(browser.driver);
+  }
+
+  // Start a browser for whoever is waiting, or to refill the pool
+  private replenish() {
+    if (this.closed || this.live >= this.size) {
+      return;
+    }
+    this.live++;
+    this.create().then(
+      (browser) => this.hand(browser),
+      (err) => {
+        this.live--;
+        this.counts.createFailures++;
+        console.log("Could not start browser:", err.message);
+      }
+    );
+  }
+
+  // Give a ready browser to the longest waiter, or put it back in the idle list
+  private hand(browser: PooledBrowser) {
+    if (this.closed) {
+      this.destroy(browser);
+      return;
+    }
+    const waiter = this.waiters.shift();
+    if (waiter) {
+      clearTimeout(waiter.timer);
+      waiter.resolve(browser);
+    } else {
+      this.idle.push(browser);
+    }
+  }
+
+  async warmUp() {
+    while (!this.closed && this.live < this.size) {
+      this.replenish();
+    }
+  }
+
+  acquire(): Promise<PooledBrowser> {
+    if (this.closed) {
+      return Promise.reject(new Error("Browser pool is closed"));
+    }
+    this.counts.checkouts++;
+    const browser = this.idle.pop();
+    if (browser) {
+      return Promise.resolve(browser);
+    }
+    this.counts.queued++;
+    const waiting = new Promise<PooledBrowser>((resolve, reject) => {
+      const waiter: Waiter = {
+        resolve,
+        reject,
+        timer: setTimeout(() => {
+          this.waiters.splice(this.waiters.indexOf(waiter), 1);
+          this.counts.waitTimeouts++;
+          reject(new Error(`No browser free within ${this.maxWaitMs}ms`));
+        }, this.maxWaitMs),
+      };
+      this.waiters.push(waiter);
+    });
+    this.replenish();
+    return waiting;
+  }
+
+  release(browser: PooledBrowser, healthy: boolean) {
+    browser.uses++;
+    if (!healthy || browser.uses >= this.maxUses) {
+      this.counts[healthy ? "recycled" : "broken"]++;
+      this.destroy(browser);
+      this.replenish();
+      return;
+    }
+    this.hand(browser);
+  }
+
+  // Run fn on a checked-out browser; the browser is replaced if fn throws or takes longer than lookupTimeoutMs
+  // (quitting it also stops whatever fn was still waiting on)
+  async withBrowser<T>(fn: (driver: WebDriver) => Promise<T>): Promise<T> {
+    const browser = await this.acquire();
+    try {
+      const result = await withTimeout(fn(browser.driver), this.lookupTimeoutMs, `Lookup took longer than ${this.lookupTimeoutMs}ms`);
+      this.release(browser, true);
+      return result;
+    } catch (err) {
+      if (err.message.startsWith("Lookup took longer")) {
+        this.counts.lookupTimeouts++;
+      }
+      this.release(browser, false);
+      throw err;
+    }
+  }
+
+  // Ask each idle browser for its title; ones that have crashed or hang are replaced
+  async checkHealth() {
+    const checking = this.idle.splice(0);
+    await Promise.all(checking.map(async (browser) => {
+      try {
+        await withTimeout(browser.driver.getTitle(), HEALTH_TIMEOUT_MS, "Health check timed out");
+        this.hand(browser);
+      } catch (err) {
+        this.counts.unhealthy++;
+        console.log("Replacing unhealthy browser:", err.message);
+        this.destroy(browser);
+        this.replenish();
+      }
+    }));
+  }
+
+  startHealthChecks(intervalMs = HEALTH_CHECK_MS) {
+    this.healthTimer = setInterval(() => this.checkHealth(), intervalMs);
+    this.healthTimer.unref();
+  }
+
+  async close() {
+    this.closed = true;
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+    }
+    for (const waiter of this.waiters.splice(0)) {
+      clearTimeout(waiter.timer);
+      waiter.reject(new Error("Browser pool is closed"));
+    }
+    this.idle.splice(0);
+    // Browsers still starting quit themselves once built (create() sees the pool is closed); wait for that
+    await Promise.all(Array.from(this.starting).map((building) => building.catch(() => undefined)));
+    // Then every remaining driver: idle, checked out by a lookup, or mid-setup
+    await Promise.all(Array.from(this.drivers).map((driver) => this.quit(driver)));
+  }
+
+  stats() {
+    return {
+      size: this.size,
+      live: this.live,
+      idle: this.idle.length,
+      waiting: this.waiters.length,
+      maxUses: this.maxUses,
+      maxWaitMs: this.maxWaitMs,
+      lookupTimeoutMs: this.lookupTimeoutMs,
+      ...this.counts,
+    };
+  }
+}
@@ -104,7 +104,14 @@ import requests
 import pickle
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-from chatbot_main import generate_response
+from chatbot_main import generate_response, fare_cache, fare_client, fare_table
+from model_registry import registry
+from resources import resources, get_gazetteer, get_spatial_index
+from session_store import sessions, SessionConflict
+from turn_pipeline import stage_stats
+from startup import startup
+from train_chatbot import predict_delays, predict_route_profile
+from route_profile import NoStoredSchedule
 
 # --- serve React build from here ---
 # path to your built React files
@@ -115,6 +122,25 @@ FRONTEND_DIST = os.path.abspath(
 app = Flask(__name__, static_folder=FRONTEND_DIST)
 CORS(app)  # still safe to allow CORS if you ever hit APIs from elsewhere
 
+# load heavy resources lazily, in the background or up front (CHATBOT_STARTUP=lazy|background|eager)
+startup.start()
+
+# upper bound on journeys per /predict call
+MAX_PREDICT_BATCH = int(os.environ.get("MAX_PREDICT_BATCH", 1000))
+
+# admin endpoints are open to these callers when MODEL_ADMIN_TOKEN is unset
+LOOPBACK_ADDRESSES = {"127.0.0.1", "::1"}
+
+# station type-ahead: default and maximum number of suggestions
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 25
+
+# readiness probe: 503 until the background/eager preload has finished
+@app.route("/ready", methods=["GET"])
+def ready():
+    readiness = startup.readiness()
+    return jsonify(readiness), (200 if readiness["ready"] else 503)
+
 # serve React’s index.html or other static assets
 @app.route("/", defaults={"path": ""})
 @app.route("/<path:path>")
@@ -143,16 +169,162 @@ def chatbot():
     if not user_input:
         return jsonify({"response": "No input provided."}), 400
 
-    response, session_id = generate_response(user_input, session_id)
-    return jsonify({"response": response, "session_id": session_id})
+    # the whole turn runs on one model version, even if a swap happens meanwhile
+    with registry.request_scope() as bundle:
+        response, session_id = generate_response(user_input, session_id)
+    return jsonify({"response": response, "session_id": session_id, "model_version": bundle.version})
 
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.json
     user_input = data.get("message")
     session_id = data.get("session_id")
-    response, session_id = generate_response(user_input, session_id)
-    return jsonify({"response": response, "session_id": session_id})
+    with registry.request_scope() as bundle:
+        response, session_id = generate_response(user_input, session_id)
+    return jsonify({"response": response, "session_id": session_id, "model_version": bundle.version})
+
+
+# the session kept changing under this turn on other workers; the client can send the message again
+@app.errorhandler(SessionConflict)
+def session_conflict(e):
+    return jsonify({"error": "The conversation was updated by another request, please retry", "session_id": str(e)}), 409
+
+
+# --- structured batch delay prediction, no NLP involved ---
+# POST /predict [{"origin": "NRW", "destination": "LST", "time": "17:30", "day": "Friday"}, ...]
+@app.route("/predict", methods=["POST"])
+def predict():
+    journeys = request.get_json(silent=True)
+    if not isinstance(journeys, list):
+        return jsonify({"error": "Expected a JSON array of journeys"}), 400
+    if len(journeys) > MAX_PREDICT_BATCH:
+        return jsonify({"error": f"At most {MAX_PREDICT_BATCH} journeys per request"}), 413
+
+    with registry.request_scope() as bundle:
+        results = predict_delays(journeys)
+    return jsonify({"results": results, "model_version": bundle.version})
+
+# POST /predict/route {"origin": "HULL", "destination": "LEEDS", "time": "06:31", "day": "Saturday"}
+# returns the predicted delay at every calling point in between
+@app.route("/predict/route", methods=["POST"])
+def predict_route():
+    journey = request.get_json(silent=True)
+    if not isinstance(journey, dict):
+        return jsonify({"error": "Expected a JSON object describing one journey"}), 400
+
+    with registry.request_scope() as bundle:
+        try:
+            profile = predict_route_profile(journey)
+        except NoStoredSchedule as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    profile["model_version"] = bundle.version
+    return jsonify(profile)
+
+
+# --- station type-ahead ---
+# GET /stations/suggest?q=manc&limit=5 -> ranked stations from the in-memory gazetteer indexes
+@app.route("/stations/suggest", methods=["GET"])
+def suggest_stations():
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", SUGGEST_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, MAX_SUGGEST_LIMIT))
+    return jsonify({"query": query, "results": get_gazetteer().suggest(query, limit)})
+
+# GET /stations/near?station=norwich&limit=5 or ?lat=52.63&lon=1.30&radius_km=10 -> nearest stations
+@app.route("/stations/near", methods=["GET"])
+def stations_near():
+    try:
+        limit = max(1, min(int(request.args.get("limit", SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT))
+        radius_km = request.args.get("radius_km")
+        radius_km = float(radius_km) if radius_km else None
+        lat, lon = request.args.get("lat"), request.args.get("lon")
+        lat, lon = (float(lat), float(lon)) if lat and lon else (None, None)
+    except ValueError:
+        return jsonify({"error": "limit, radius_km, lat and lon must be numbers"}), 400
+
+    spatial_index = get_spatial_index()
+    station = request.args.get("station", "").strip()
+    if station:
+        code = get_gazetteer().resolve(station)
+        results = spatial_index.near_station(code, limit, radius_km) if code else None
+        if results is None:
+            return jsonify({"error": f"Unknown station '{station}'"}), 404
+        return jsonify({"station": code, "results": results})
+    if lat is None:
+        return jsonify({"error": "Pass a station or lat and lon"}), 400
+    return jsonify({"lat": lat, "lon": lon, "results": spatial_index.nearest(lat, lon, limit, radius_km)})
+
+
+# --- model registry admin ---
+def admin_authorised(req=None):
+    # when MODEL_ADMIN_TOKEN is set the caller has to send it back in X-Admin-Token;
+    # without a token only callers on this machine get in. req: another framework's request (the async mode's)
+    req = req or request
+    token = os.environ.get("MODEL_ADMIN_TOKEN")
+    if not token:
+        return req.remote_addr in LOOPBACK_ADDRESSES
+    return req.headers.get("X-Admin-Token") == token
+
+@app.route("/admin/model", methods=["GET"])
+def model_status():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(registry.status())
+
+# shared NLP resources: how often each was built versus requested, and the extractor's memo hit rates
+@app.route("/admin/resources", methods=["GET"])
+def resource_stats():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    from nlpprocessor import JourneyExtractor
+    caches = resources.get("journey_extractor").cache_stats() if resources.is_built("journey_extractor") else None
+    return jsonify({
+        "resources": resources.stats(),
+        "journey_extractor_instances": JourneyExtractor.instances_created,
+        "journey_extractor_caches": caches,
+    })
+
+# live conversations, expiries/evictions and their approximate memory use
+@app.route("/admin/sessions", methods=["GET"])
+def session_stats():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(sessions.stats())
+
+# fare table and cache hit rates, and upstream versus coalesced scraper calls
+@app.route("/admin/fares", methods=["GET"])
+def fare_stats():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"table": fare_table.stats(), "cache": fare_cache.stats(), "client": fare_client.stats()})
+
+# where chat turns spend their time, per pipeline stage
+@app.route("/admin/pipeline", methods=["GET"])
+def pipeline_stats():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(stage_stats.summary())
+
+# POST /admin/model/reload            swap to the version named in ml_model/ACTIVE
+# POST /admin/model/reload {"version": "20250517-221530"}   activate and swap to that version
+@app.route("/admin/model/reload", methods=["POST"])
+def reload_model():
+    if not admin_authorised():
+        return jsonify({"error": "Forbidden"}), 403
+    version = (request.get_json(silent=True) or {}).get("version")
+    try:
+        active_version = registry.activate(version) if version else registry.reload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        app.logger.error(f"Model reload failed: {e}")
+        return jsonify({"error": "Model reload failed", "detail": str(e)}), 500
+    return jsonify({"model_version": active_version})
 
 
 # --- your existing ticket lookup endpoint ---
@@ -193,5 +365,8 @@ def cheapest_ticket():
 # --- run the combined server ---
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    # pick up newly trained models on SIGHUP or when ml_model/ACTIVE changes
+    registry.install_signal_handler()
+    registry.start_watcher(interval=float(os.environ.get("MODEL_WATCH_INTERVAL", 2.0)))
     # debug=False in demo
     app.run(host="0.0.0.0", port=port, debug=False)
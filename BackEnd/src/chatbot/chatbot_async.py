@@ -0,0 +1,123 @@
+# chatbot_async.py
+# ----------------
+# async serving mode: the same routes and JSON as chatbot_api.py on one event loop, so conversations
+# waiting on the fare scraper hold no thread. Needs `pip install quart quart-cors` (Quart brings hypercorn).
+#   python chatbot_async.py            or            hypercorn chatbot_async:app --bind 0.0.0.0:5000
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from hypercorn.middleware import AsyncioWSGIMiddleware
+import chatbot_api  # the Flask app, which still serves every route not handled here
+from chatbot_main import generate_response, fare_cache, FaresNeeded
+from model_registry import registry
+from session_store import SessionConflict
+
+# threads running the CPU-bound part of a turn (intent model, NLP, delay prediction)
+CHAT_WORKERS = int(os.environ.get("CHAT_WORKERS", os.cpu_count() or 4))
+# routes answered on the event loop; anything else goes to the Flask app on a thread
+ASYNC_PATHS = {"/chatbot", "/chat", "/admin/async"}
+
+turn_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat-turn")
+counts = {"turns": 0, "fare_waits": 0, "fare_wait_timeouts": 0, "session_conflicts": 0}
+gauges = {"waiting_on_fares": 0, "queued_or_running": 0}
+
+chat_app = cors(Quart(__name__), allow_origin="*")
+
+
+def run_turn(user_input, session_id, defer_fares):
+    # the whole turn runs on one model version, even if a swap happens meanwhile; fare lookups on
+    # these threads never wait on the scraper (fare_budget=0), the event loop does the waiting
+    with registry.request_scope() as bundle:
+        response, session_id = generate_response(user_input, session_id, defer_fares=defer_fares, fare_budget=0)
+    return response, session_id, bundle.version
+
+
+async def on_executor(user_input, session_id, defer_fares):
+    gauges["queued_or_running"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(turn_executor, run_turn, user_input, session_id, defer_fares)
+    finally:
+        gauges["queued_or_running"] -= 1
+
+
+async def wait_for_fares(fill):
+    """Await the scrape a turn stopped for, up to the fare budget."""
+    counts["fare_waits"] += 1
+    gauges["waiting_on_fares"] += 1
+    try:
+        # asyncio.wait never cancels the scrape, which still finishes into the cache if the budget runs out
+        done, _ = await asyncio.wait({asyncio.wrap_future(fill)}, timeout=fare_cache.budget)
+        if not done:
+            counts["fare_wait_timeouts"] += 1
+    finally:
+        gauges["waiting_on_fares"] -= 1
+
+
+async def respond(user_input, session_id):
+    """Run the turn on a thread; if its answer needs a route scraped, it stops before changing anything,
+    the scrape is awaited here and the turn runs again, taking the fares from the cache or, past the
+    budget, from old or estimated fares without waiting a second time."""
+    counts["turns"] += 1
+    try:
+        return await on_executor(user_input, session_id, True)
+    except FaresNeeded as needed:
+        await wait_for_fares(needed.fill)
+        return await on_executor(user_input, needed.session_id, False)
+
+
+@chat_app.route("/chatbot", methods=["GET", "POST"])
+async def chatbot():
+    if request.method == "GET":
+        return "Chatbot endpoint is live. Please send a POST request with a message."
+
+    data = await request.get_json()
+    user_input = data.get("message", "")
+    session_id = data.get("session_id")
+    if not user_input:
+        return jsonify({"response": "No input provided."}), 400
+
+    response, session_id, version = await respond(user_input, session_id)
+    return jsonify({"response": response, "session_id": session_id, "model_version": version})
+
+@chat_app.errorhandler(SessionConflict)
+async def session_conflict(e):
+    counts["session_conflicts"] += 1
+    return jsonify({"error": "The conversation was updated by another request, please retry", "session_id": str(e)}), 409
+
+@chat_app.route("/chat", methods=["POST"])
+async def chat():
+    data = await request.get_json()
+    response, session_id, version = await respond(data.get("message"), data.get("session_id"))
+    return jsonify({"response": response, "session_id": session_id, "model_version": version})
+
+# turns waiting on fares without a thread versus turns queued for or running on the turn executor
+@chat_app.route("/admin/async", methods=["GET"])
+async def async_stats():
+    if not chatbot_api.admin_authorised(request):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"workers": CHAT_WORKERS, **gauges, **counts})
+
+
+flask_app = AsyncioWSGIMiddleware(chatbot_api.app)
+
+
+async def app(scope, receive, send):
+    """ASGI entry point: chat turns on the event loop, every other route on the Flask app."""
+    if scope["type"] == "http" and scope["path"] not in ASYNC_PATHS:
+        await flask_app(scope, receive, send)
+    else:
+        await chat_app(scope, receive, send)
+
+
+# --- run the async server ---
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = [f"0.0.0.0:{int(os.environ.get('PORT', 5000))}"]
+    # pick up newly trained models on SIGHUP or when ml_model/ACTIVE changes
+    registry.install_signal_handler()
+    registry.start_watcher(interval=float(os.environ.get("MODEL_WATCH_INTERVAL", 2.0)))
+    asyncio.run(serve(app, config))
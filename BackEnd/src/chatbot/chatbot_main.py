@@ -1,24 +1,22 @@
 # imports:
+import copy
 import random
 import re
-import uuid
 import time
 import warnings
-import requests
 from train_chatbot import predict_delay_from_input
 from extra_features import get_train_crowd_info, get_random_weather
-from nlpprocessor import JourneyExtractor  # Import JourneyExtractor for NLP
-from flask import jsonify  # Import jsonify for Flask response
-from station_dicts import STATION_CODES, STATION_NAME_TO_CODE  # <-- Make sure this import is at the top
+from turn_pipeline import parse_turn  # Parses each message once for all handlers
+from resources import get_gazetteer, get_spatial_index  # Station names, codes and aliases shared with the NLP layer
+from session_store import sessions, SessionConflict, SESSION_SAVE_RETRIES  # Conversations with idle expiry, a session cap and bounded history
+from fare_cache import FareCache  # Scraped fares per route, kept on disk between restarts
+from fare_client import FareClient  # Pooled, coalescing HTTP client for the fare scraper
+from fare_table import FareTable, record_demand  # Fares collected nightly for popular routes
 
 warnings.filterwarnings("ignore")  # Suppress warnings
 
-# Initialize the JourneyExtractor with debug off
-journey_extractor = JourneyExtractor(debug=False)
-
 # Global conversation memory
 conversation_history = {}
-active_conversations = {}
 
 # predefined intents:
 intents = {
@@ -86,6 +84,16 @@ intents = {
     ]
 }
 
+# keyword groups checked, in order, when no intent pattern matches:
+INTENT_FALLBACKS = [
+    # Enhanced detection for booking
+    ("book_ticket", ["book", "buy", "purchase", "reserve", "get ticket"]),
+    # Enhanced detection for ticket price queries
+    ("ticket_price", ["ticket", "price", "cost", "fare", "how much", "cheap"]),
+    # Enhanced detection for delay queries
+    ("delay_prediction", ["delay", "train", "late", "on time", "journey", "travel", "from", "to"]),
+]
+
 # Define conversation states
 CONVERSATION_STATES = {
     "GREETING": "GREETING",
@@ -104,40 +112,31 @@ CONVERSATION_STATES = {
     "COLLECTING_SPECIAL_TICKET": "COLLECTING_SPECIAL_TICKET",
 }
 
-# Create a new conversation session
-def create_conversation_session():
-    session_id = str(uuid.uuid4())
-    active_conversations[session_id] = {
+# Create a new conversation session (under the caller's id when resuming an expired one)
+def create_conversation_session(session_id=None):
+    return sessions.create({
         "state": CONVERSATION_STATES["GREETING"],
         "journey_info": {},
-        "last_interaction": time.time(),
         "missing_fields": [],
         "last_message": None
-    }
-    return session_id
+    }, session_id)
 
 # Update an existing conversation
 def update_conversation(session_id, user_input):
-    if session_id not in active_conversations:
-        session_id = create_conversation_session()
-    
-    conversation = active_conversations[session_id]
-    conversation["last_interaction"] = time.time()
-    
-    # Save user input to conversation history
-    if "history" not in conversation:
-        conversation["history"] = []
-    
+    conversation = sessions.get(session_id)
+    if conversation is None:
+        # Unknown or expired: start over but keep the id the client holds
+        create_conversation_session(session_id)
+        conversation = sessions.get(session_id)
+
+    # Save user input to conversation history (the store keeps only the latest messages)
     conversation["history"].append({"role": "user", "message": user_input})
     return conversation
 
 # Save bot response to conversation history
 def save_bot_response(session_id, response):
-    if session_id in active_conversations:
-        conversation = active_conversations[session_id]
-        if "history" not in conversation:
-            conversation["history"] = []
-        
+    conversation = sessions.get(session_id)
+    if conversation is not None:
         conversation["history"].append({"role": "bot", "message": response})
         conversation["last_message"] = response
 
@@ -149,50 +148,32 @@ def match_intent(user_input):
             if pattern in user_input:
                 return intent["tag"]
 
-    # Enhanced detection for booking
-    if any(word in user_input for word in ["book", "buy", "purchase", "reserve", "get ticket"]):
-        return "book_ticket"
-
-    # Enhanced detection for ticket price queries
-    if any(word in user_input for word in ["ticket", "price", "cost", "fare", "how much", "cheap"]):
-        return "ticket_price"
-    
-    # Enhanced detection for delay queries
-    if any(word in user_input for word in ["delay", "train", "late", "on time", "journey", "travel", "from", "to"]):
-        return "delay_prediction"
+    # Booking, then ticket price, then delay keywords
+    for tag, words in INTENT_FALLBACKS:
+        if any(word in user_input for word in words):
+            return tag
 
     return "unknown"
 
 # function to extract train journey details using NLP:
-def extract_train_info(text, existing_info=None):
+def extract_train_info(text, existing_info=None, parsed=None):
     """Extract train journey details using JourneyExtractor."""
+    # Reuse the turn's parse when the caller has one
+    parsed = parsed or parse_turn(text)
+
     # Start with existing info if provided
     result = existing_info or {}
     
     # Extract new information
-    journey_info = journey_extractor.extract_journey_details(text)
+    journey_info = parsed.journey
     
     # Update with new info, only if not already present
     for key in ["origin", "destination", "departure_time", "departure_day"]:
         if key in journey_info and journey_info[key] and (key not in result or not result[key]):
             result[key] = journey_info[key]
     
-    text_lower = text.lower()
-    # Ticket type
-    if "single" in text_lower or "one way" in text_lower:
-        result["ticket_type"] = "SINGLE"
-    elif "return" in text_lower or "round trip" in text_lower:
-        result["ticket_type"] = "RETURN"
-    # Ticket time
-    if "off-peak" in text_lower or "off peak" in text_lower:
-        result["ticket_time"] = "OFF-PEAK"
-    elif "anytime" in text_lower or "any time" in text_lower:
-        result["ticket_time"] = "ANYTIME"
-    # Ticket age
-    if "adult" in text_lower:
-        result["ticket_age"] = "ADULT"
-    elif "child" in text_lower or "kid" in text_lower:
-        result["ticket_age"] = "CHILD"
+    # Ticket type, time and age keywords
+    result.update(parsed.ticket_fields)
     
     return result if result else None
 
@@ -254,26 +235,27 @@ def generate_collecting_question(missing_field, journey_info):
     return "Could you provide more details about your journey?"
 
 # Updated handle_direct_answer function
-def handle_direct_answer(user_input, conversation):
+def handle_direct_answer(user_input, conversation, parsed=None):
+    parsed = parsed or parse_turn(user_input)
     state = conversation["state"]
-    user_input_original = user_input.strip()
-    user_input_upper = user_input_original.upper()
-    user_input_lower = user_input_original.lower()
+    user_input_upper = parsed.upper
+    user_input_lower = parsed.normalised
 
     if not conversation.get("journey_info"):
         conversation["journey_info"] = {}
 
-    # Helper: Find all station names that contain the user's input
-    def find_station_options(query):
-        return [(name, STATION_NAME_TO_CODE[name]) for name in STATION_NAME_TO_CODE if query in name]
+    gazetteer = get_gazetteer()
+
+    # Helper: Find all station names that contain the user's input (substring index, no full scan)
+    find_station_options = gazetteer.find_substring
 
     # Handle origin
     if state == CONVERSATION_STATES["COLLECTING_ORIGIN"]:
-        if user_input_upper in STATION_CODES:
+        if gazetteer.is_crs(user_input_upper):
             conversation["journey_info"]["origin"] = user_input_upper
             return True
-        elif user_input_lower in STATION_NAME_TO_CODE:
-            conversation["journey_info"]["origin"] = STATION_NAME_TO_CODE[user_input_lower]
+        elif gazetteer.code_for_name(user_input_lower):
+            conversation["journey_info"]["origin"] = gazetteer.code_for_name(user_input_lower)
             return True
         else:
             # Try to find partial matches
@@ -293,11 +275,11 @@ def handle_direct_answer(user_input, conversation):
 
     # Handle destination
     elif state == CONVERSATION_STATES["COLLECTING_DESTINATION"]:
-        if user_input_upper in STATION_CODES:
+        if gazetteer.is_crs(user_input_upper):
             conversation["journey_info"]["destination"] = user_input_upper
             return True
-        elif user_input_lower in STATION_NAME_TO_CODE:
-            conversation["journey_info"]["destination"] = STATION_NAME_TO_CODE[user_input_lower]
+        elif gazetteer.code_for_name(user_input_lower):
+            conversation["journey_info"]["destination"] = gazetteer.code_for_name(user_input_lower)
             return True
         else:
             # Try to find partial matches
@@ -325,21 +307,21 @@ def handle_direct_answer(user_input, conversation):
     
     # Handle new ticket-specific states
     elif state == CONVERSATION_STATES["COLLECTING_TICKET_TYPE"]:
-        if "single" in user_input_original.lower():
+        if "single" in user_input_lower:
             conversation["journey_info"]["ticket_type"] = "SINGLE"
         else:
             conversation["journey_info"]["ticket_type"] = "RETURN"
         return True
         
     elif state == CONVERSATION_STATES["COLLECTING_TICKET_TIME"]:
-        if "off" in user_input_original.lower():
+        if "off" in user_input_lower:
             conversation["journey_info"]["ticket_time"] = "OFF-PEAK"
         else:
             conversation["journey_info"]["ticket_time"] = "ANYTIME"
         return True
         
     elif state == CONVERSATION_STATES["COLLECTING_TICKET_AGE"]:
-        if "adult" in user_input_original.lower():
+        if "adult" in user_input_lower:
             conversation["journey_info"]["ticket_age"] = "ADULT"
         else:
             conversation["journey_info"]["ticket_age"] = "CHILD"
@@ -375,17 +357,91 @@ SPECIAL_TICKET_KEYS = {
 }
 SPECIAL_TICKET_NAMES = list(SPECIAL_TICKET_KEYS.keys())
 
+# Raised out of a turn run with defer_fares when its answer needs a route scraped first; the turn has not
+# happened (the conversation is as it was), so the caller can wait on `fill` and run it again
+class FaresNeeded(Exception):
+    def __init__(self, fill, session_id=None):
+        super().__init__(session_id)
+        self.fill = fill
+        self.session_id = session_id
+
 # function to generate chatbot response with improved conversation capabilities
-def generate_response(user_input, session_id=None):
+# defer_fares: raise FaresNeeded instead of waiting on a scrape; fare_budget: how long a fare lookup may wait
+def generate_response(user_input, session_id=None, defer_fares=False, fare_budget=None):
+    # Lowercase, tokenise and classify the message once for every handler below
+    parsed = parse_turn(user_input)
+    parsed.classify(match_intent)
+
+    if not session_id:
+        session_id = create_conversation_session()
+
+    # Turns of one session run one at a time (state and journey_info change in place), other sessions in parallel
+    for attempt in range(SESSION_SAVE_RETRIES + 1):
+        with sessions.lock(session_id):
+            start = time.perf_counter()
+            if defer_fares:
+                response, session_id = respond_or_restore(parsed, session_id, fare_budget)
+            else:
+                response, session_id = respond_to_turn(parsed, session_id, fare_budget=fare_budget)
+            # Journey extraction happens lazily while responding and is already its own stage
+            parsed.timings["respond"] = time.perf_counter() - start - parsed.timings.get("journey", 0.0)
+            conversation = sessions.get(session_id)
+            if conversation is None:
+                break
+            prefetch_fares(conversation)
+            conversation["last_turn_timings"] = parsed.timings
+            try:
+                sessions.save(session_id, conversation)
+                break
+            except SessionConflict:
+                # Another worker answered a turn of this session meanwhile: answer again from its state
+                if attempt == SESSION_SAVE_RETRIES:
+                    raise
+    parsed.finish()
+    return response, session_id
+
+# A turn that may stop for fares: keep a copy of the conversation and put it back if it does
+def respond_or_restore(parsed, session_id, fare_budget=None):
+    conversation = sessions.get(session_id)
+    if conversation is None:
+        # Unknown or expired: start over but keep the id the client holds, so there is something to put back
+        create_conversation_session(session_id)
+        conversation = sessions.get(session_id)
+    snapshot = copy.deepcopy(conversation)
+    try:
+        return respond_to_turn(parsed, session_id, defer_fares=True, fare_budget=fare_budget)
+    except FaresNeeded as needed:
+        conversation.clear()
+        conversation.update(snapshot)
+        needed.session_id = session_id
+        raise
+
+# Start scraping the route as soon as a ticket question names both ends, while the remaining fields are asked for
+def prefetch_fares(conversation):
+    journey_info = conversation.get("journey_info", {})
+    origin, destination = journey_info.get("origin"), journey_info.get("destination")
+    if conversation.get("current_task") != "ticket_price" or not origin or not destination:
+        return
+    # Remember the route on the session so later turns don't resubmit it
+    route = f"{origin}:{destination}"
+    if conversation.get("fare_prefetch") != route:
+        conversation["fare_prefetch"] = route
+        # Asked-for routes feed the nightly fare table job
+        record_demand(origin, destination)
+        if fare_table.get(origin, destination) is None:
+            fare_cache.prefetch(origin, destination)
+
+def respond_to_turn(parsed, session_id=None, defer_fares=False, fare_budget=None):
+    user_input = parsed.text
     if not session_id:
         session_id = create_conversation_session()
     conversation = update_conversation(session_id, user_input)
-    intent_tag = match_intent(user_input)
-    direct_answer_handled = handle_direct_answer(user_input, conversation)
+    intent_tag = parsed.intent
+    direct_answer_handled = handle_direct_answer(user_input, conversation, parsed)
 
     # --- Handle special ticket prompt state ---
     if conversation["state"] == CONVERSATION_STATES["ASK_SPECIAL_TICKET"]:
-        if user_input.strip().lower() in ["yes", "y"]:
+        if parsed.normalised in ["yes", "y"]:
             conversation["state"] = CONVERSATION_STATES["COLLECTING_SPECIAL_TICKET"]
             prompt = (
                 "Which special ticket do you need? (Flexi Season, Travelcard, Carnet Single, "
@@ -393,7 +449,7 @@ def generate_response(user_input, session_id=None):
             )
             save_bot_response(session_id, prompt)
             return prompt, session_id
-        elif user_input.strip().lower() in ["no", "n"]:
+        elif parsed.normalised in ["no", "n"]:
             conversation["journey_info"]["special_ticket"] = None
             conversation["state"] = CONVERSATION_STATES["PROVIDING_TICKET_INFO"]
             # Continue to price selection below (let the rest of the function run)
@@ -405,7 +461,7 @@ def generate_response(user_input, session_id=None):
     if conversation["state"] == CONVERSATION_STATES["COLLECTING_SPECIAL_TICKET"]:
         normalized = None
         for name in SPECIAL_TICKET_NAMES:
-            if name in user_input.lower():
+            if name in parsed.lower:
                 normalized = name
                 break
         if normalized:
@@ -422,7 +478,7 @@ def generate_response(user_input, session_id=None):
 
     # --- Handle FOLLOW_UP state ---
     if conversation["state"] == CONVERSATION_STATES["FOLLOW_UP"]:
-        if user_input.strip().lower() in ["no", "no thanks", "nothing", "that's all", "exit", "bye", "goodbye"]:
+        if parsed.normalised in ["no", "no thanks", "nothing", "that's all", "exit", "bye", "goodbye"]:
             # Reset state and info
             conversation["state"] = CONVERSATION_STATES["GREETING"]
             conversation["current_task"] = None
@@ -436,7 +492,7 @@ def generate_response(user_input, session_id=None):
             save_bot_response(session_id, greeting)
             return greeting, session_id
         # If user says yes or asks a new question, reset and continue
-        elif user_input.strip().lower() in ["yes", "sure", "okay", "yep"]:
+        elif parsed.normalised in ["yes", "sure", "okay", "yep"]:
             response = "Great! What would you like to do next? You can ask for ticket prices or delay predictions."
             conversation["state"] = CONVERSATION_STATES["GREETING"]
             conversation["current_task"] = None
@@ -444,7 +500,7 @@ def generate_response(user_input, session_id=None):
             save_bot_response(session_id, response)
             return response, session_id
         # If user asks for delay prediction after ticket, use last journey_info
-        elif "delay" in user_input.lower():
+        elif "delay" in parsed.lower:
             # Use previous journey_info for delay prediction
             delay = predict_delay_from_input("", weather=None, journey_info=conversation["journey_info"])
             response = f"Here's the delay prediction for your journey:\n\n{delay}\n\nAnything else I can help with?"
@@ -502,7 +558,7 @@ def generate_response(user_input, session_id=None):
     ):
         conversation["current_task"] = "ticket_price"
         if not direct_answer_handled:
-            journey_info = extract_train_info(user_input, conversation.get("journey_info", {}))
+            journey_info = extract_train_info(user_input, conversation.get("journey_info", {}), parsed)
             if journey_info:
                 conversation["journey_info"] = journey_info
         missing_fields = get_missing_ticket_fields(conversation.get("journey_info", {}))
@@ -520,7 +576,7 @@ def generate_response(user_input, session_id=None):
             # Fetch real fares
             origin = conversation["journey_info"]["origin"]
             destination = conversation["journey_info"]["destination"]
-            fares_json = fetch_real_fare(origin, destination)
+            fares_json, fare_source = fetch_real_fare(origin, destination, defer_fares, fare_budget)
             if fares_json:
                 ticket_name, price = select_ticket_price(fares_json, conversation["journey_info"])
                 if ticket_name == "NO_SINGLE":
@@ -548,6 +604,12 @@ def generate_response(user_input, session_id=None):
                         f"({ticket_name}) from {origin} to {destination}, the price is {price}.\n"
                         f"You can book this ticket here: {booking_url}"
                     )
+                    if fare_source in ("stale", "estimate"):
+                        ticket_info += (
+                            "\nLive fares are unavailable right now, so this price is "
+                            f"{'an estimate' if fare_source == 'estimate' else 'from an earlier lookup'} "
+                            "- please check it on the booking page."
+                        )
                 else:
                     ticket_info = "Sorry, I couldn't find a matching ticket for your request."
             else:
@@ -589,7 +651,7 @@ def generate_response(user_input, session_id=None):
     ):
         conversation["current_task"] = "delay_prediction"
         if not direct_answer_handled:
-            journey_info = extract_train_info(user_input, conversation.get("journey_info", {}))
+            journey_info = extract_train_info(user_input, conversation.get("journey_info", {}), parsed)
             if journey_info:
                 conversation["journey_info"] = journey_info
             else:
@@ -605,8 +667,11 @@ def generate_response(user_input, session_id=None):
             if "departure_day" in train_info:
                 understood_msg += f" on {train_info['departure_day']}"
             weather = get_random_weather()
-            delay = predict_delay_from_input(user_input, weather)
-            crowd_msg = get_train_crowd_info(user_input, weather)
+            delay = predict_delay_from_input(user_input, weather, journey_info=train_info)
+            crowd_msg = get_train_crowd_info(
+                user_input, weather,
+                rush_hour=parsed.mentions_rush_hour, weekend=parsed.mentions_weekend,
+            )
             full_response = f"{understood_msg}.\n\n{delay}"
             if crowd_msg:
                 full_response += f"\n\n{crowd_msg}"
@@ -641,20 +706,29 @@ def generate_response(user_input, session_id=None):
     save_bot_response(session_id, response)
     return response, session_id
 
-def fetch_real_fare(origin, destination):
-    url = f"http://localhost:3000/?originStation={origin}&destinationStation={destination}"
-    try:
-        resp = requests.get(url, timeout=15)
-        print(f"Fetching fares from: {url}")
-        print(f"Status code: {resp.status_code}")
-        print(f"Response text: {resp.text}")
-        if resp.status_code == 200:
-            return resp.json()
-        else:
-            return None
-    except Exception as e:
-        print(f"Error fetching fares: {e}")
-        return None
+def fetch_real_fare(origin, destination, defer=False, budget=None):
+    # Popular routes come from the nightly fare table without any scrape. Scraping a route takes
+    # seconds, so other answers come from the fare cache whenever it can;
+    # returns (fares, source), see FareCache.lookup. With defer, a route that would wait on a scrape
+    # raises FaresNeeded instead; budget caps the wait otherwise (0: answer from old or estimated fares at once)
+    fares = fare_table.get(origin, destination)
+    if fares is not None:
+        return fares, "table"
+    if defer:
+        fill = fare_cache.waiting_fill(origin, destination)
+        if fill is not None:
+            raise FaresNeeded(fill)
+    return fare_cache.lookup(origin, destination, budget=budget)
+
+def route_distance_km(origin, destination):
+    gazetteer = get_gazetteer()
+    return get_spatial_index().distance_km(gazetteer.resolve(origin), gazetteer.resolve(destination))
+
+# One pooled client for the scraper: concurrent lookups of a route share one scrape,
+# and a scraper that keeps failing is left alone while answers come from old or estimated fares
+fare_client = FareClient()
+fare_cache = FareCache(fare_client.fetch, distance=route_distance_km)
+fare_table = FareTable()
 
 def select_ticket_price(fares_json, journey_info):
     ticket_age = journey_info.get("ticket_age", "ADULT").capitalize()
@@ -699,7 +773,7 @@ def select_ticket_price(fares_json, journey_info):
 
     # Fallback: any non-special ticket
     for key, ticket in fares_json.items():
-        if key not in exclude_keys:
+        if key not in exclude_keys and isinstance(ticket, dict):
             price = ticket.get(ticket_age)
             if price:
                 return key, price
@@ -731,7 +805,7 @@ if __name__ == "__main__":
             
         response, session_id = generate_response(user_input, session_id)
         # Get the conversation object
-        conversation = active_conversations[session_id]
+        conversation = sessions.get(session_id) or {}
         if conversation.get("last_message"):
             print(f"Bot: {conversation['last_message']}")
         else:
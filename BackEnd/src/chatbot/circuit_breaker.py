@@ -0,0 +1,90 @@
+# imports:
+import time
+import threading
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a dependency that keeps failing, and probes it again after a cool-down.
+
+    - closed: calls go through; `failure_threshold` failures in a row open the circuit
+    - open: calls are refused straight away for `reset_seconds`
+    - half_open: one trial call goes through; success closes the circuit, failure reopens it
+
+    Callers ask `allow()` before calling and report the outcome with
+    `record_success()` / `record_failure()`; a timeout is a failure.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0, history=20):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.transitions = deque(maxlen=history)
+        self.counts = {"successes": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    def _move(self, state, now):
+        # caller holds the lock
+        self.transitions.append({"from": self.state, "to": state, "at": now})
+        self.state = state
+        if state == OPEN:
+            self.opened_at = now
+            self.counts["opened"] += 1
+
+    def allow(self):
+        now = time.time()
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+                self._move(HALF_OPEN, now)
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._trial_in_flight):
+                self._trial_in_flight = self.state == HALF_OPEN
+                return True
+            self.counts["short_circuited"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.counts["successes"] += 1
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                self._move(CLOSED, time.time())
+
+    def record_failure(self):
+        with self._lock:
+            self.counts["failures"] += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._move(OPEN, time.time())
+
+    def release(self):
+        """The allowed call was abandoned before reaching the dependency: no outcome to record."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def is_open(self):
+        """True while calls would be refused (an open circuit still cooling down)."""
+        with self._lock:
+            return self.state == OPEN and time.time() - self.opened_at < self.reset_seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_seconds,
+                "opened_at": self.opened_at,
+                **self.counts,
+                "transitions": list(self.transitions),
+            }
@@ -0,0 +1,185 @@
+# imports:
+import io
+import os
+import pickle
+import hashlib
+import pandas as pd
+import numpy as np
+
+# bump when the layout of the cached frame changes so old caches are rebuilt:
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".cache.pkl"
+
+COLUMNS = ["origin", "destination", "scheduled", "actual", "date"]
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def cache_path_for(source_path):
+    """The cache lives next to the file it was built from."""
+    return source_path + CACHE_SUFFIX
+
+
+def _hash_prefix(path, size):
+    """blake2b digest of the first `size` bytes of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = size
+    with open(path, "rb") as file:
+        while remaining > 0:
+            chunk = file.read(min(HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _complete_lines_size(path, size):
+    """Offset just after the last newline, so a half-written final line is never cached."""
+    if size == 0:
+        return 0
+    with open(path, "rb") as file:
+        position = size
+        while position > 0:
+            start = max(0, position - 4096)
+            file.seek(start)
+            block = file.read(position - start)
+            index = block.rfind(b"\n")
+            if index != -1:
+                return start + index + 1
+            position = start
+    return 0
+
+
+def parse_rows(raw_bytes):
+    """Parse Darwin csv rows into the cleaned, typed frame used for training."""
+    if not raw_bytes:
+        return _empty_frame()
+    df = pd.read_csv(io.BytesIO(raw_bytes), header=None, names=COLUMNS, dtype=str)
+
+    # remove any missing data:
+    df.dropna(inplace=True)
+
+    # remove rows with blank station codes:
+    df = df[(df["origin"].str.strip() != "") & (df["destination"].str.strip() != "")]
+
+    # convert to datetime:
+    df["sched_dt"] = pd.to_datetime(df["date"] + " " + df["scheduled"], errors="coerce", format="mixed")
+    df["actual_dt"] = pd.to_datetime(df["date"] + " " + df["actual"], errors="coerce", format="mixed")
+
+    # remove rows with failed datetime parsing:
+    df = df.dropna(subset=["sched_dt", "actual_dt"])
+
+    # delays are whole seconds (Darwin times have at most half-minute precision), minutes derive from them:
+    delay_seconds = (df["actual_dt"] - df["sched_dt"]).dt.total_seconds()
+    df["delay_seconds"] = delay_seconds.astype(np.int32)
+    df["delay_minutes"] = df["delay_seconds"] / 60.0
+
+    for column in COLUMNS:
+        df[column] = df[column].astype("category")
+    return df.reset_index(drop=True)
+
+
+def _empty_frame():
+    df = pd.DataFrame({column: pd.Series(dtype="category") for column in COLUMNS})
+    df["sched_dt"] = pd.Series(dtype="datetime64[ns]")
+    df["actual_dt"] = pd.Series(dtype="datetime64[ns]")
+    df["delay_seconds"] = pd.Series(dtype=np.int32)
+    df["delay_minutes"] = pd.Series(dtype=np.float64)
+    return df
+
+
+def _concat_frames(head, tail):
+    """Append rows while keeping every station/date column categorical."""
+    if tail.empty:
+        return head
+    if head.empty:
+        return tail
+    combined = {}
+    for column in head.columns:
+        if isinstance(head[column].dtype, pd.CategoricalDtype):
+            combined[column] = pd.api.types.union_categoricals([head[column], tail[column]], ignore_order=True)
+        else:
+            combined[column] = np.concatenate([head[column].to_numpy(), tail[column].to_numpy()])
+    return pd.DataFrame(combined)
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        return file.read(end - start)
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as file:
+            cached = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != CACHE_FORMAT_VERSION:
+        return None
+    return cached
+
+
+def _write_cache(cache_path, meta, frame):
+    # write to a temp file first so a crash never leaves a truncated cache behind:
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump({"version": CACHE_FORMAT_VERSION, "meta": meta, "frame": frame}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def load_training_frame(source_path, use_cache=True, verbose=False):
+    """Return the cleaned Darwin frame for `source_path`, parsing as little as possible.
+
+    The cache records the size, mtime and hash of the bytes it was built from:
+    - same size and mtime: the cached frame is returned as is
+    - same size, new mtime: the file is rehashed and only rebuilt if it changed
+    - larger file whose old prefix hashes the same: only the new lines are parsed and appended
+    - anything else: full rebuild
+    """
+    def log(message):
+        if verbose:
+            print(f"data cache: {message}")
+
+    stat = os.stat(source_path)
+    size = _complete_lines_size(source_path, stat.st_size)
+    cache_path = cache_path_for(source_path)
+
+    # a trailing half-written line is parsed every time but never stored:
+    partial = parse_rows(_read_range(source_path, size, stat.st_size)) if size < stat.st_size else None
+
+    def with_partial(frame):
+        return _concat_frames(frame, partial) if partial is not None else frame
+
+    if not use_cache:
+        return with_partial(parse_rows(_read_range(source_path, 0, size)))
+
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        meta, frame = cached["meta"], cached["frame"]
+        if meta["size"] == size and meta["mtime_ns"] == stat.st_mtime_ns:
+            log("hit")
+            return with_partial(frame)
+
+        if meta["size"] == size and _hash_prefix(source_path, size) == meta["hash"]:
+            log("touched but unchanged, refreshing mtime")
+            meta["mtime_ns"] = stat.st_mtime_ns
+            _write_cache(cache_path, meta, frame)
+            return with_partial(frame)
+
+        if meta["size"] < size and _hash_prefix(source_path, meta["size"]) == meta["hash"]:
+            log(f"source grew by {size - meta['size']} bytes, extending")
+            frame = _concat_frames(frame, parse_rows(_read_range(source_path, meta["size"], size)))
+            meta = {"size": size, "mtime_ns": stat.st_mtime_ns, "hash": _hash_prefix(source_path, size)}
+            _write_cache(cache_path, meta, frame)
+            return with_partial(frame)
+
+    log("miss, parsing source")
+    frame = parse_rows(_read_range(source_path, 0, size))
+    meta = {"size": size, "mtime_ns": stat.st_mtime_ns, "hash": _hash_prefix(source_path, size)}
+    try:
+        _write_cache(cache_path, meta, frame)
+    except OSError as e:
+        log(f"could not write cache: {e}")
+    return with_partial(frame)
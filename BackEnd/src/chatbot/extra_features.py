@@ -12,7 +12,8 @@ def get_random_weather():
         "rainy", "heavy rain", "stormy", "heavy snow", "thunderstorm"
     ])
 
-def get_train_crowd_info(user_input, weather=None):
+# rush_hour/weekend can be passed in when the message was already scanned (see turn_pipeline.py)
+def get_train_crowd_info(user_input, weather=None, rush_hour=None, weekend=None):
     advice = []
 
     if weather is None:
@@ -23,11 +24,15 @@ def get_train_crowd_info(user_input, weather=None):
     else:
         advice.append(f"The weather is {weather}, so no weather-induced disruptions are expected.")
 
-    rush_hours = [str(h).zfill(2) for h in list(range(7, 11)) + list(range(16, 20))]
-    if any(rh in user_input for rh in rush_hours):
+    if rush_hour is None:
+        rush_hours = [str(h).zfill(2) for h in list(range(7, 11)) + list(range(16, 20))]
+        rush_hour = any(rh in user_input for rh in rush_hours)
+    if rush_hour:
         advice.append("It is rush hour, so trains might be crowded.")
 
-    if "saturday" in user_input.lower() or "sunday" in user_input.lower():
+    if weekend is None:
+        weekend = "saturday" in user_input.lower() or "sunday" in user_input.lower()
+    if weekend:
         advice.append("Weekend schedules may differ; please check in advance.")
 
     return " ".join(advice)
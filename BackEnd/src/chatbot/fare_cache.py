@@ -0,0 +1,291 @@
+# imports:
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+FARE_CACHE_PATH = os.environ.get(
+    "FARE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fares.cache.json")
+)
+# fares for a route rarely change: serve them as they are for this long
+FARE_TTL_SECONDS = float(os.environ.get("FARE_TTL_SECONDS", 12 * 3600))
+# after that, keep answering from the old fares for this long while a background refresh runs
+FARE_STALE_SECONDS = float(os.environ.get("FARE_STALE_SECONDS", 7 * 24 * 3600))
+# routes the scraper found no fare table for are retried after this long
+FARE_NEGATIVE_TTL_SECONDS = float(os.environ.get("FARE_NEGATIVE_TTL_SECONDS", 3600))
+# background threads scraping routes (misses, refreshes and prefetches)
+FARE_FETCH_WORKERS = int(os.environ.get("FARE_FETCH_WORKERS", 4))
+# longest a question waits on the scraper before it is answered from old or estimated fares
+FARE_BUDGET_SECONDS = float(os.environ.get("FARE_BUDGET_SECONDS", 5))
+
+# bump when the layout of the cache file changes so old files are ignored:
+CACHE_FORMAT_VERSION = 1
+
+
+def is_negative(fares):
+    """The scraper's answer for routes brfares has no fare table for."""
+    return isinstance(fares, dict) and "error" in fares
+
+
+def is_cacheable(fares):
+    """Fare tables and "no fare table" answers are kept; failures (None) and empty scrapes are not."""
+    return isinstance(fares, dict) and bool(fares)
+
+
+def parse_price(text):
+    """12.3 for "£12.30", None for anything without a number in it."""
+    match = re.search(r"\d+(?:\.\d+)?", str(text).replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def fit_line(points):
+    """Least-squares (slope, intercept) through (x, y) points, None with fewer than two distinct x."""
+    n = len(points)
+    if n < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return slope, mean_y - slope * mean_x
+
+
+class FareCache:
+    """Fares per (origin, destination), in memory and persisted to a JSON file across restarts.
+
+    - fresh entries (younger than ttl, or negative_ttl for "no fare table") are returned directly
+    - stale entries (up to stale_ttl past that) are returned directly and refreshed in a background thread
+    - anything older, or unknown, is fetched while the caller waits up to `budget`
+      seconds; if the fetch fails or runs over, the caller gets the old entry
+      whatever its age, else an estimate from the distance and the fares of
+      cached routes, and the fetch carries on into the cache for the next question
+
+    Every scrape runs on a small pool, at most one per route at a time.
+    """
+
+    def __init__(self, fetch, path=FARE_CACHE_PATH, ttl=FARE_TTL_SECONDS, stale_ttl=FARE_STALE_SECONDS,
+                 negative_ttl=FARE_NEGATIVE_TTL_SECONDS, budget=FARE_BUDGET_SECONDS, distance=None):
+        self.fetch = fetch
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.budget = budget
+        self.distance = distance    # (origin, destination) -> km or None, used for estimates
+        self._entries = None    # "ORIGIN:DESTINATION" -> {"fares", "fetched_at"}, loaded on first use
+        self._fills = {}    # "ORIGIN:DESTINATION" -> Future of the scrape in flight
+        self._fetcher = None
+        self._lock = threading.Lock()
+        self.counts = {
+            "hits": 0, "negative_hits": 0, "stale_hits": 0, "misses": 0, "fills": 0, "fill_failures": 0,
+            "budget_exceeded": 0, "stale_on_error": 0, "estimates": 0, "unanswered": 0, "prefetches": 0,
+        }
+
+    @staticmethod
+    def key(origin, destination):
+        return f"{origin.strip().upper()}:{destination.strip().upper()}"
+
+    # --- persistence ---
+    def _load(self):
+        # caller holds the lock
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return
+        if isinstance(cached, dict) and cached.get("version") == CACHE_FORMAT_VERSION:
+            self._entries = cached.get("entries", {})
+
+    def _persist(self):
+        # caller holds the lock; write to a temp file first so a crash never leaves a truncated cache behind
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": CACHE_FORMAT_VERSION, "entries": self._entries}, file, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not write fare cache: {e}")
+
+    def _store(self, key, fares):
+        with self._lock:
+            self._entries[key] = {"fares": fares, "fetched_at": time.time()}
+            self._persist()
+
+    # --- lookups ---
+    def _fresh_for(self, entry):
+        return self.negative_ttl if is_negative(entry["fares"]) else self.ttl
+
+    def get(self, origin, destination):
+        """Fares for the route (the scraper's JSON), None if they could not be fetched."""
+        return self.lookup(origin, destination)[0]
+
+    def lookup(self, origin, destination, budget=None):
+        """(fares, source) for the route; source says how far to trust them:
+
+        "cache" or "live" for the scraper's own answer, "stale" for an entry past
+        its stale window, "estimate" for estimated fares, None when there is nothing.
+        `budget` overrides how long a miss waits on the scrape; 0 never waits.
+        """
+        key = self.key(origin, destination)
+        now = time.time()
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry["fetched_at"]
+                fresh_for = self._fresh_for(entry)
+                if age <= fresh_for:
+                    self.counts["negative_hits" if is_negative(entry["fares"]) else "hits"] += 1
+                    return entry["fares"], "cache"
+                if age <= fresh_for + self.stale_ttl:
+                    self.counts["stale_hits"] += 1
+                    self._fill(key, origin, destination)
+                    return entry["fares"], "cache"
+            self.counts["misses"] += 1
+            fill = self._fill(key, origin, destination)
+
+        try:
+            fares = fill.result(timeout=self.budget if budget is None else budget)
+        except FutureTimeout:
+            fares = None
+            with self._lock:
+                self.counts["budget_exceeded"] += 1
+        if is_cacheable(fares):
+            return fares, "live"
+        if entry is not None:
+            with self._lock:
+                self.counts["stale_on_error"] += 1
+            return entry["fares"], "stale"
+        estimate = self.estimate(origin, destination)
+        with self._lock:
+            self.counts["estimates" if estimate else "unanswered"] += 1
+        if estimate:
+            return estimate, "estimate"
+        return fares, None
+
+    def _fill(self, key, origin, destination):
+        # caller holds the lock; the worker cannot drop the key from _fills before we have added it
+        fill = self._fills.get(key)
+        if fill is None:
+            if self._fetcher is None:
+                self._fetcher = ThreadPoolExecutor(max_workers=FARE_FETCH_WORKERS, thread_name_prefix="fare-fetch")
+            fill = self._fills[key] = self._fetcher.submit(self._fetch_and_store, key, origin, destination)
+        return fill
+
+    def _fetch_and_store(self, key, origin, destination):
+        try:
+            fares = self.fetch(origin, destination)
+            if is_cacheable(fares):
+                self._store(key, fares)
+            with self._lock:
+                self.counts["fills" if is_cacheable(fares) else "fill_failures"] += 1
+            return fares
+        finally:
+            with self._lock:
+                self._fills.pop(key, None)
+
+    def waiting_fill(self, origin, destination):
+        """The Future a lookup() of the route would wait on, starting the scrape if need be;
+        None when lookup() answers at once (fresh entries, and stale ones whose refresh runs in the background)."""
+        key = self.key(origin, destination)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["fetched_at"] <= self._fresh_for(entry) + self.stale_ttl:
+                return None
+            return self._fill(key, origin, destination)
+
+    def prefetch(self, origin, destination):
+        """Start fetching the route in the background unless it is fresh or already being fetched; returns at once.
+
+        A later get() for the route then finds it cached, or waits on the scrape
+        still in flight instead of starting its own.
+        """
+        key = self.key(origin, destination)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["fetched_at"] <= self._fresh_for(entry):
+                return False
+            if key in self._fills:
+                return False
+            self.counts["prefetches"] += 1
+            self._fill(key, origin, destination)
+        return True
+
+    def estimate(self, origin, destination):
+        """Fares estimated from the route's distance, None without a distance or enough cached routes.
+
+        Each ticket name gets its own straight-line fit of price against distance
+        over the cached routes that sell it, so the estimate only names tickets
+        that have been seen on at least two routes of different lengths.
+        """
+        if self.distance is None:
+            return None
+        km = self.distance(origin, destination)
+        if km is None:
+            return None
+        with self._lock:
+            self._load()
+            routes = [(key, entry["fares"]) for key, entry in self._entries.items() if not is_negative(entry["fares"])]
+
+        samples = {}    # ticket name -> {"TicketType", "Adult": [(km, price)], "Child": [...]}
+        for key, fares in routes:
+            route_km = self.distance(*key.split(":", 1))
+            if route_km is None:
+                continue
+            for name, ticket in fares.items():
+                if not isinstance(ticket, dict):
+                    continue
+                sample = samples.setdefault(name, {"TicketType": ticket.get("TicketType"), "Adult": [], "Child": []})
+                for age in ("Adult", "Child"):
+                    price = parse_price(ticket.get(age)) if ticket.get(age) else None
+                    if price is not None:
+                        sample[age].append((route_km, price))
+
+        estimate = {}
+        for name, sample in samples.items():
+            ticket = {"TicketType": sample["TicketType"]}
+            for age in ("Adult", "Child"):
+                line = fit_line(sample[age]) if sample[age] else None
+                if line is not None:
+                    ticket[age] = f"£{max(0.0, line[0] * km + line[1]):.2f}"
+            if "Adult" in ticket:
+                estimate[name] = ticket
+        return estimate or None
+
+    def invalidate(self, origin=None, destination=None):
+        """Forget one route, or every route when called without arguments."""
+        with self._lock:
+            self._load()
+            if origin is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.key(origin, destination), None)
+            self._persist()
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            now = time.time()
+            fresh = sum(now - entry["fetched_at"] <= self._fresh_for(entry) for entry in self._entries.values())
+            lookups = self.counts["hits"] + self.counts["negative_hits"] + self.counts["stale_hits"] + self.counts["misses"]
+            return {
+                "routes": len(self._entries),
+                "fresh_routes": fresh,
+                "negative_routes": sum(is_negative(entry["fares"]) for entry in self._entries.values()),
+                "fetching": len(self._fills),
+                "ttl_seconds": self.ttl,
+                "stale_seconds": self.stale_ttl,
+                "negative_ttl_seconds": self.negative_ttl,
+                "budget_seconds": self.budget,
+                "hit_rate": round((lookups - self.counts["misses"]) / lookups, 4) if lookups else None,
+                **self.counts,
+            }
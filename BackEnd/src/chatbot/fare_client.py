@@ -0,0 +1,198 @@
+# imports:
+import os
+import sys
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from circuit_breaker import CircuitBreaker
+
+FARE_SCRAPER_URL = os.environ.get("FARE_SCRAPER_URL", "http://localhost:3000/")
+FARE_TIMEOUT_SECONDS = float(os.environ.get("FARE_TIMEOUT_SECONDS", 15))
+# every scrape starts a headless Chrome, so only this many run at once
+FARE_MAX_CONCURRENCY = int(os.environ.get("FARE_MAX_CONCURRENCY", 2))
+# keep-alive connections kept open to the scraper
+FARE_POOL_SIZE = int(os.environ.get("FARE_POOL_SIZE", 8))
+# failed or timed-out scrapes in a row before the scraper is left alone for FARE_BREAKER_RESET_SECONDS
+FARE_BREAKER_FAILURES = int(os.environ.get("FARE_BREAKER_FAILURES", 5))
+FARE_BREAKER_RESET_SECONDS = float(os.environ.get("FARE_BREAKER_RESET_SECONDS", 30))
+
+
+class _Call:
+    """One upstream lookup and everyone waiting for its result."""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class FareClient:
+    """Fetches fares from the scraper over a pooled keep-alive session.
+
+    Lookups for a route that is already being fetched do not start another
+    scrape: they wait for the one in flight and share its result. Upstream
+    calls are limited to `max_concurrency` at a time; a call that cannot get
+    a slot within the timeout gives up (returns None) rather than queueing
+    without bound. Once the scraper keeps failing or timing out, a circuit
+    breaker refuses lookups straight away (returns None) until a trial
+    request gets through again.
+    """
+
+    def __init__(self, url=FARE_SCRAPER_URL, timeout=FARE_TIMEOUT_SECONDS, max_concurrency=FARE_MAX_CONCURRENCY,
+                 pool_size=FARE_POOL_SIZE, breaker=None):
+        self.url = url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._session = None
+        self.breaker = breaker or CircuitBreaker("fare-scraper", FARE_BREAKER_FAILURES, FARE_BREAKER_RESET_SECONDS)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = {}    # (origin, destination) -> _Call
+        self._lock = threading.Lock()
+        self.counts = {"lookups": 0, "upstream_calls": 0, "coalesced": 0, "failures": 0, "rejected": 0}
+        self.active = 0
+        self.slot_wait_seconds = 0.0
+        self.upstream_seconds = 0.0
+
+    def session(self):
+        # built on first use so importing the chatbot opens no connections
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def fetch(self, origin, destination):
+        """The scraper's JSON for the route, None if the lookup failed."""
+        key = (origin.strip().upper(), destination.strip().upper())
+        with self._lock:
+            self.counts["lookups"] += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = self._upstream(*key)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
+
+    def _upstream(self, origin, destination):
+        if not self.breaker.allow():
+            return None
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.counts["rejected"] += 1
+            # our own queue was full, which says nothing about the scraper
+            self.breaker.release()
+            return None
+        with self._lock:
+            self.slot_wait_seconds += time.perf_counter() - start
+            self.counts["upstream_calls"] += 1
+            self.active += 1
+        start = time.perf_counter()
+        try:
+            return self._request(origin, destination)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.active -= 1
+                self.upstream_seconds += time.perf_counter() - start
+
+    def _request(self, origin, destination):
+        params = {"originStation": origin, "destinationStation": destination}
+        try:
+            resp = self.session().get(self.url, params=params, timeout=self.timeout)
+            fares = resp.json() if resp.status_code == 200 else None
+        except Exception as e:
+            return self._failed(origin, destination, type(e).__name__)
+        if resp.status_code != 200:
+            return self._failed(origin, destination, f"status {resp.status_code}")
+        # the scraper answers {} when Chrome fell over, and {"error": ...} when the route has no fare table
+        if not isinstance(fares, dict) or not fares:
+            return self._failed(origin, destination, "empty response")
+        self.breaker.record_success()
+        return fares
+
+    def _failed(self, origin, destination, reason):
+        print(f"Fare lookup {origin}->{destination} failed: {reason}")
+        self.breaker.record_failure()
+        with self._lock:
+            self.counts["failures"] += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            calls = self.counts["upstream_calls"]
+            return {
+                **self.counts,
+                "in_flight": len(self._in_flight),
+                "active_upstream": self.active,
+                "max_concurrency": self.max_concurrency,
+                "mean_slot_wait_ms": round(self.slot_wait_seconds * 1000 / calls, 3) if calls else None,
+                "mean_upstream_ms": round(self.upstream_seconds * 1000 / calls, 3) if calls else None,
+                "breaker": self.breaker.stats(),
+            }
+
+
+# --- demo: python fare_client.py [n_users] ---
+def demo(n_users=50, scrape_seconds=0.5):
+    """Concurrent users against a stand-in scraper that takes `scrape_seconds` per lookup."""
+    import json
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class SlowScraper(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        connections = set()
+
+        def do_GET(self):
+            SlowScraper.connections.add(self.client_address)
+            time.sleep(scrape_seconds)
+            body = json.dumps({"OFF-PEAK S": {"TicketType": "Single", "Adult": "£12.30"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), SlowScraper)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{server.server_address[1]}/"
+
+    scenarios = (("same route", lambda i: ("NRW", "LST")), ("4 routes", lambda i: ("NRW", ["LST", "CBG", "IPS", "COL"][i % 4])))
+    for name, route in scenarios:
+        client = FareClient(url=url)
+        threads = [threading.Thread(target=client.fetch, args=route(i)) for i in range(n_users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = client.stats()
+        print(f"{name}: {n_users} users in {time.perf_counter() - start:.2f}s, "
+              f"{stats['upstream_calls']} upstream calls, {stats['coalesced']} coalesced, "
+              f"mean slot wait {stats['mean_slot_wait_ms']} ms")
+    print(f"distinct client connections seen by the scraper: {len(SlowScraper.connections)}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    demo(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
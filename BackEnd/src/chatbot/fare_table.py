@@ -0,0 +1,271 @@
+# imports:
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from fare_cache import FareCache, is_cacheable
+from circuit_breaker import CLOSED
+
+_here = os.path.dirname(os.path.abspath(__file__))
+FARE_TABLE_PATH = os.environ.get("FARE_TABLE_PATH", os.path.join(_here, "fares.table.json"))
+# the table is rebuilt nightly; entries older than this (a few missed runs) are ignored
+FARE_TABLE_MAX_AGE_SECONDS = float(os.environ.get("FARE_TABLE_MAX_AGE_SECONDS", 3 * 24 * 3600))
+# one line per ticket question that named both stations, read back by the batch job
+FARE_DEMAND_LOG_PATH = os.environ.get("FARE_DEMAND_LOG_PATH", os.path.join(_here, "fare_demand.log"))
+# routes the batch job collects, and how many days of the demand log it counts
+FARE_TABLE_ROUTES = int(os.environ.get("FARE_TABLE_ROUTES", 500))
+FARE_DEMAND_DAYS = float(os.environ.get("FARE_DEMAND_DAYS", 30))
+# a route whose scrape fails is tried this many more times, waiting FARE_TABLE_BACKOFF_SECONDS, then twice that, ...
+FARE_TABLE_RETRIES = int(os.environ.get("FARE_TABLE_RETRIES", 3))
+FARE_TABLE_BACKOFF_SECONDS = float(os.environ.get("FARE_TABLE_BACKOFF_SECONDS", 5))
+
+# bump when the layout of the table file changes so old files are ignored:
+TABLE_FORMAT_VERSION = 1
+
+_demand_lock = threading.Lock()
+
+
+# --- where the popular routes come from ---
+def record_demand(origin, destination, path=FARE_DEMAND_LOG_PATH):
+    """Append one asked-for route to the demand log."""
+    line = f"{int(time.time())}\t{origin.strip().upper()}\t{destination.strip().upper()}\n"
+    with _demand_lock:
+        try:
+            with open(path, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as e:
+            print(f"Could not write fare demand log: {e}")
+
+
+def demand_pairs(path=FARE_DEMAND_LOG_PATH, days=FARE_DEMAND_DAYS):
+    """How often each (origin, destination) was asked for in the last `days` days."""
+    oldest = time.time() - days * 24 * 3600
+    counts = Counter()
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 3 and parts[0].isdigit() and int(parts[0]) >= oldest:
+                    counts[(parts[1], parts[2])] += 1
+    except OSError:
+        pass
+    return counts
+
+
+def compact_demand_log(path=FARE_DEMAND_LOG_PATH, days=FARE_DEMAND_DAYS):
+    """Drop the lines older than `days` days from the demand log; returns how many were dropped.
+
+    The chatbot keeps appending while this runs (from another process, so the
+    lock does not cover it): lines added after the log was read are copied
+    over before the compacted file replaces it.
+    """
+    oldest = time.time() - days * 24 * 3600
+    with _demand_lock:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                lines = file.readlines()
+                read_to = file.tell()
+        except OSError:
+            return 0
+        kept = [line for line in lines
+                if line.split("\t", 1)[0].isdigit() and int(line.split("\t", 1)[0]) >= oldest]
+        if len(kept) == len(lines):
+            return 0
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.writelines(kept)
+                with open(path, "r", encoding="utf-8") as log:
+                    log.seek(read_to)
+                    file.write(log.read())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not compact fare demand log: {e}")
+            return 0
+    return len(lines) - len(kept)
+
+
+def darwin_pairs():
+    """How many Darwin calls each (service origin, calling point) pair has, as CRS codes."""
+    # pandas and the Darwin parse only load when the batch job runs
+    from data_cache import load_training_frame
+    from route_profile import data_path
+    from resources import get_gazetteer
+    frame = load_training_frame(data_path)
+    gazetteer = get_gazetteer()
+    counts = Counter()
+    for (origin, destination), calls in frame.groupby(["origin", "destination"]).size().items():
+        origin, destination = gazetteer.resolve(str(origin)), gazetteer.resolve(str(destination))
+        if origin and destination and origin != destination:
+            counts[(origin, destination)] += int(calls)
+    return counts
+
+
+def popular_pairs(limit=FARE_TABLE_ROUTES, demand=None, darwin=None):
+    """The routes worth collecting: those users asked for most, then the busiest Darwin pairs."""
+    demand = demand_pairs() if demand is None else demand
+    darwin = darwin_pairs() if darwin is None else darwin
+    pairs = [pair for pair, _ in demand.most_common()]
+    seen = set(pairs)
+    for pair, _ in darwin.most_common():
+        if len(pairs) >= limit:
+            break
+        if pair not in seen:
+            seen.add(pair)
+            pairs.append(pair)
+    return pairs[:limit]
+
+
+# --- the table the chatbot reads ---
+class FareTable:
+    """Fares collected in bulk for popular routes, read from a JSON file the batch job rewrites.
+
+    The file is re-read whenever its modification time changes, so a nightly
+    rebuild is picked up without restarting the chatbot.
+    """
+
+    def __init__(self, path=FARE_TABLE_PATH, max_age=FARE_TABLE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self._routes = {}    # "ORIGIN:DESTINATION" -> [fetched_at, fares]
+        self._built_at = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "expired": 0, "reloads": 0}
+
+    def _reload_if_changed(self):
+        # caller holds the lock
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime, self._routes, self._built_at = mtime, {}, None
+        if mtime is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                table = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Could not read fare table: {e}")
+            return
+        if isinstance(table, dict) and table.get("version") == TABLE_FORMAT_VERSION:
+            self._routes = table.get("routes", {})
+            self._built_at = table.get("built_at")
+            self.counts["reloads"] += 1
+
+    def get(self, origin, destination):
+        """The route's fares from the table, None if it is not in it or too old."""
+        key = FareCache.key(origin, destination)
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._routes.get(key)
+            if entry is None:
+                self.counts["misses"] += 1
+                return None
+            if time.time() - entry[0] > self.max_age:
+                self.counts["expired"] += 1
+                return None
+            self.counts["hits"] += 1
+            return entry[1]
+
+    def __contains__(self, route):
+        return self.get(*route) is not None
+
+    def stats(self):
+        with self._lock:
+            self._reload_if_changed()
+            return {
+                "path": self.path,
+                "routes": len(self._routes),
+                "built_at": self._built_at,
+                "max_age_seconds": self.max_age,
+                **self.counts,
+            }
+
+
+# --- the batch job ---
+def batch_client():
+    """A fare client for the batch job with a circuit breaker of its own, so a bad night for the
+    scraper never opens the breaker live chat lookups go through (and live failures never stop the batch)."""
+    from fare_client import FareClient, FARE_BREAKER_FAILURES, FARE_BREAKER_RESET_SECONDS
+    from circuit_breaker import CircuitBreaker
+    return FareClient(breaker=CircuitBreaker("fare-table-batch", FARE_BREAKER_FAILURES, FARE_BREAKER_RESET_SECONDS))
+
+
+def build_fare_table(pairs, client=None, path=FARE_TABLE_PATH, workers=None,
+                     retries=FARE_TABLE_RETRIES, backoff=FARE_TABLE_BACKOFF_SECONDS):
+    """Scrape every pair and write the table; routes that still fail after `retries` keep their previous fares.
+
+    The pairs are scraped on `workers` threads (the client's own concurrency
+    limit by default), so the scraper never sees more than that at once. A
+    failed scrape is retried with exponential backoff, and while the client's
+    breaker is open the route waits out its cool-down instead of failing,
+    so a short scraper outage costs time, not table entries.
+    Pass a client from batch_client(), never the chatbot's own.
+    """
+    client = client or batch_client()
+    workers = workers or client.max_concurrency
+
+    routes = {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+        if previous.get("version") == TABLE_FORMAT_VERSION:
+            routes = previous.get("routes", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    def collect(pair):
+        # failed scrapes and breaker cool-downs are counted apart, up to `retries` of each
+        failures = cooldowns = 0
+        while True:
+            fares = client.fetch(*pair)
+            if is_cacheable(fares):
+                break
+            # an open (or probing) breaker refused the call or was tripped by it
+            resting = client.breaker.state != CLOSED
+            if resting:
+                cooldowns += 1
+            else:
+                failures += 1
+            if failures > retries or cooldowns > retries:
+                break
+            time.sleep(client.breaker.reset_seconds if resting else backoff * 2 ** (failures - 1))
+        return pair, fares, failures + cooldowns
+
+    start = time.perf_counter()
+    collected = failed = retried = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fare-table") as pool:
+        for (origin, destination), fares, waits in pool.map(collect, pairs):
+            retried += waits
+            if is_cacheable(fares):
+                routes[FareCache.key(origin, destination)] = [int(time.time()), fares]
+                collected += 1
+            else:
+                failed += 1
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({"version": TABLE_FORMAT_VERSION, "built_at": int(time.time()), "routes": routes},
+                  file, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return {"pairs": len(pairs), "collected": collected, "failed": failed, "retries": retried, "routes": len(routes),
+            "seconds": round(time.perf_counter() - start, 1), "client": client.stats()}
+
+
+# --- nightly: python fare_table.py [n_routes] ---
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else FARE_TABLE_ROUTES
+    pairs = popular_pairs(limit)
+    dropped = compact_demand_log()
+    if dropped:
+        print(f"Dropped {dropped} demand log lines older than {FARE_DEMAND_DAYS:g} days")
+    print(f"Collecting fares for {len(pairs)} routes into {FARE_TABLE_PATH}")
+    summary = build_fare_table(pairs)
+    print(f"{summary['collected']} collected, {summary['failed']} failed ({summary['retries']} retries) in {summary['seconds']}s; "
+          f"{summary['routes']} routes in the table")
@@ -0,0 +1,144 @@
+# imports:
+import re
+import sys
+import time
+import random
+from collections import defaultdict
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# how many trigram-ranked candidates are rescored with the real fuzzy scorer
+DEFAULT_MAX_CANDIDATES = 128
+
+
+def normalise(text):
+    """Same normalisation thefuzz applies by default: lowercase, non-alphanumerics to spaces, trimmed."""
+    return NON_ALNUM.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(text):
+    """Padded character trigrams of each word, so short codes and word starts still produce grams."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Fuzzy station lookup that only scores a few likely candidates instead of every choice.
+
+    An inverted index maps each trigram to the choices containing it. A query
+    counts shared trigrams through the posting lists, keeps the best
+    `max_candidates` choices and rescores just those with thefuzz's WRatio, so the
+    top-k matches agree with a full `process.extract` scan in practice at a
+    fraction of the cost.
+    """
+
+    def __init__(self, choices, max_candidates=DEFAULT_MAX_CANDIDATES):
+        # deduplicate while keeping first-seen order
+        self.choices = list(dict.fromkeys(choices))
+        self.max_candidates = max_candidates
+        self._choice_set = set(self.choices)
+        self._processed = [normalise(choice) for choice in self.choices]
+        self._gram_counts = []
+        self._postings = defaultdict(list)
+        for index, processed in enumerate(self._processed):
+            grams = trigrams(processed)
+            self._gram_counts.append(len(grams) or 1)
+            for gram in grams:
+                self._postings[gram].append(index)
+
+    def __contains__(self, choice):
+        return choice in self._choice_set
+
+    def __len__(self):
+        return len(self.choices)
+
+    def __iter__(self):
+        return iter(self.choices)
+
+    def candidates(self, query):
+        """Indexes of the choices sharing the most trigrams with `query`, best first."""
+        query_grams = trigrams(normalise(query))
+        if not query_grams:
+            return []
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for index in self._postings.get(gram, ()):
+                shared[index] += 1
+        # rank by overlap with the query, then by how much of the choice is covered
+        ranked = sorted(shared, key=lambda index: (shared[index], shared[index] / self._gram_counts[index]), reverse=True)
+        return ranked[:self.max_candidates]
+
+    def extract(self, query, limit=3):
+        """Drop-in for thefuzz.process.extract(query, choices, limit=limit) over the indexed choices."""
+        from thefuzz import process
+
+        candidate_choices = [self.choices[index] for index in self.candidates(query)]
+        if not candidate_choices:
+            return []
+        return process.extract(query, candidate_choices, limit=limit)
+
+
+# --- benchmark: python fuzzy_index.py [n_queries] ---
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _typo(text, rng):
+    if len(text) < 4:
+        return text
+    i = rng.randrange(len(text) - 1)
+    operation = rng.choice(["drop", "swap", "replace"])
+    if operation == "drop":
+        return text[:i] + text[i + 1:]
+    if operation == "swap":
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + text[i + 1:]
+
+
+def benchmark(n_queries=300, limit=3, tolerance=5, seed=42):
+    """Compare lookups against the current full process.extract scan on the real station vocabulary."""
+    from thefuzz import process
+    from resources import get_station_vocabulary, get_gazetteer
+
+    vocabulary = get_station_vocabulary()
+    index = TrigramIndex(vocabulary.values())
+    scan_choices = list(vocabulary.values())  # what match_station used to scan
+
+    # queries: station names and codes users type, half of them with a typo
+    rng = random.Random(seed)
+    pool = list(get_gazetteer().by_name) + list(index.choices)
+    queries = [rng.choice(pool) for _ in range(n_queries)]
+    queries = [_typo(query, rng) if i % 2 else query for i, query in enumerate(queries)]
+
+    timings = {"scan": [], "index": []}
+    top1_same, topk_within = 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        expected = process.extract(query.upper(), scan_choices, limit=limit)
+        timings["scan"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        actual = index.extract(query.upper(), limit=limit)
+        timings["index"].append(time.perf_counter() - start)
+
+        if actual and expected and (actual[0][0] == expected[0][0] or actual[0][1] >= expected[0][1] - tolerance):
+            top1_same += 1
+        expected_scores = [score for _, score in expected]
+        actual_scores = [score for _, score in actual] + [0] * (len(expected_scores) - len(actual))
+        if all(a >= e - tolerance for a, e in zip(actual_scores, expected_scores)):
+            topk_within += 1
+
+    print(f"{len(index)} unique choices (scan covers {len(scan_choices)}), {n_queries} queries")
+    print(f"{'':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, values in timings.items():
+        print(f"{name:>8} {_percentile(values, 0.5) * 1000:>9.3f} {_percentile(values, 0.99) * 1000:>9.3f}")
+    print(f"top-1 match or score within {tolerance}: {top1_same / n_queries:.1%}")
+    print(f"top-{limit} scores within {tolerance}: {topk_within / n_queries:.1%}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,283 @@
+# imports:
+import os
+import re
+import csv
+from fuzzy_index import TrigramIndex
+
+stations_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "stations_codes.csv"))
+
+NON_LETTERS = re.compile(r"[^A-Z]")
+BRACKETED = re.compile(r"\(.*?\)")
+
+# Darwin TIPLOCs that the abbreviation heuristic below gets wrong or cannot work out
+TIPLOC_OVERRIDES = {
+    "BHAMNWS": "BHM", "BLFR": "BFR", "CANONST": "CST", "CHRX": "CHX", "ECROYDN": "ECR",
+    "EDINBUR": "EDB", "EUSTON": "EUS", "GLGC": "GLC", "HTRWTM4": "HAF", "KNGX": "KGX",
+    "LIVST": "LST", "LNDNBDC": "LBG", "LVRPLCH": "LVC", "LVRPLSH": "LIV", "MARYLBN": "MYB",
+    "MNCRIAP": "MIA", "MNCRPIC": "MAN", "PADTLL": "PAD", "PADTON": "PAD", "PRST": "PRE",
+    "STALBCY": "SAC", "STPX": "STP", "STPXBOX": "STP", "VICTRIC": "VIC", "WATRLMN": "WAT",
+}
+
+# TIPLOCs of junctions and sidings have no passenger station
+JUNCTION_SUFFIXES = ("J", "JN", "JCN", "SDG", "SDGS")
+
+# suggestions shorter than this come from the prefix trie only, typos need a few letters to match on
+MIN_FUZZY_QUERY = 3
+
+# a TIPLOC must cover at least this share of the letters of the station name it abbreviates
+MIN_TIPLOC_COVERAGE = 0.4
+
+
+class Station:
+    __slots__ = ("crs", "name", "lat", "lon", "tiplocs", "aliases")
+
+    def __init__(self, crs, name, lat=None, lon=None):
+        self.crs = crs
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.tiplocs = []
+        self.aliases = []
+
+    def as_dict(self):
+        return {"crs": self.crs, "name": self.name, "lat": self.lat, "lon": self.lon,
+                "tiplocs": list(self.tiplocs), "aliases": list(self.aliases)}
+
+
+class PrefixTrie:
+    """Maps every prefix of the inserted keys to the ids stored under them, in insertion order."""
+
+    def __init__(self):
+        # node = [children, ids]
+        self._root = [{}, []]
+
+    def insert(self, key, station_id):
+        node = self._root
+        for char in key:
+            node = node[0].setdefault(char, [{}, []])
+            if not node[1] or node[1][-1] != station_id:
+                node[1].append(station_id)
+
+    def complete(self, prefix, limit=None):
+        node = self._root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        ids = list(dict.fromkeys(node[1]))
+        return ids[:limit] if limit else ids
+
+
+def _name_keys(name):
+    """Letters-only uppercase forms of a station name a TIPLOC may abbreviate."""
+    upper = BRACKETED.sub("", name).upper()
+    keys = {NON_LETTERS.sub("", upper)}
+    if upper.startswith("LONDON "):
+        keys.add(NON_LETTERS.sub("", upper[len("LONDON "):]))
+    return [key for key in keys if key]
+
+
+def _abbreviation_score(tiploc, key):
+    """How well `tiploc` reads as an abbreviation of `key`, None if it is not a subsequence of it.
+
+    Scores the length of the exact shared prefix first and coverage second, so
+    SHEFFLD prefers Sheffield over Shenfield and EUSTON prefers London Euston.
+    """
+    if tiploc[0] != key[0] or len(tiploc) / len(key) < MIN_TIPLOC_COVERAGE:
+        return None
+    position, prefix, contiguous = 0, 0, True
+    for char in tiploc:
+        found = key.find(char, position)
+        if found < 0:
+            return None
+        if contiguous and found == position:
+            prefix += 1
+        else:
+            contiguous = False
+        position = found + 1
+    return prefix + len(tiploc) / len(key)
+
+
+class Gazetteer:
+    """One vocabulary for station names, aliases, CRS codes and Darwin TIPLOCs.
+
+    Built from stations_codes.csv (names, CRS, coordinates), the NLP aliases and
+    the TIPLOCs seen in dataFile.txt. TIPLOCs are linked to CRS codes through
+    TIPLOC_OVERRIDES and an abbreviation heuristic; unlinked TIPLOCs (mostly
+    junctions) still resolve to themselves. Lookups by code, name or alias are
+    dict hits, and candidate lists come from a prefix trie and an n-gram
+    substring index, so nothing scans all station names per request.
+    """
+
+    def __init__(self, stations_csv=stations_path, tiplocs=(), aliases=None):
+        self.stations = []
+        self.by_crs = {}
+        self.by_name = {}
+        self.by_alias = {}
+        self.tiploc_to_crs = {}
+        self.tiplocs = set()
+        self._trie = PrefixTrie()
+        self._ngrams = {}
+        self._fuzzy = None
+
+        self._load_stations(stations_csv)
+        for alias, crs in (aliases or {}).items():
+            self.add_alias(alias, crs)
+        self._link_tiplocs(tiplocs)
+        self._build_indexes()
+
+    # --- building ---
+    def _load_stations(self, stations_csv):
+        with open(stations_csv, newline="", encoding="utf-8") as csvfile:
+            for row in csv.DictReader(csvfile):
+                crs = row["crsCode"].strip().upper()
+                name = row["stationName"].strip()
+                if not crs or not name:
+                    continue
+                try:
+                    lat, lon = float(row["lat"]), float(row["long"])
+                except (TypeError, ValueError):
+                    lat = lon = None
+                station = Station(crs, name, lat, lon)
+                self.stations.append(station)
+                self.by_crs[crs] = station
+                self.by_name[name.lower()] = crs
+
+    def add_alias(self, alias, crs):
+        alias = alias.strip().lower()
+        station = self.by_crs.get(crs)
+        if not alias or station is None or alias in self.by_name:
+            return
+        self.by_alias[alias] = crs
+        station.aliases.append(alias)
+
+    def _link_tiplocs(self, tiplocs):
+        by_first_letter = {}
+        for station in self.stations:
+            for key in _name_keys(station.name):
+                by_first_letter.setdefault(key[0], []).append((key, station.crs))
+
+        for tiploc in tiplocs:
+            tiploc = tiploc.strip().upper()
+            if not tiploc:
+                continue
+            self.tiplocs.add(tiploc)
+            crs = TIPLOC_OVERRIDES.get(tiploc)
+            if crs is None and not tiploc.endswith(JUNCTION_SUFFIXES):
+                scored = []
+                for key, candidate in by_first_letter.get(tiploc[0], ()):
+                    score = _abbreviation_score(tiploc, key)
+                    if score is not None:
+                        scored.append((score, candidate))
+                scored.sort(reverse=True)
+                # only link when one station is clearly the best reading
+                if scored and (len(scored) == 1 or scored[0][0] > scored[1][0]):
+                    crs = scored[0][1]
+            if crs in self.by_crs:
+                self.tiploc_to_crs[tiploc] = crs
+                self.by_crs[crs].tiplocs.append(tiploc)
+
+    def _build_indexes(self):
+        for station_id, station in enumerate(self.stations):
+            self._trie.insert(station.name.lower(), station_id)
+        # later words and aliases rank after names that start with the prefix
+        for station_id, station in enumerate(self.stations):
+            words = station.name.lower().split()
+            for i in range(1, len(words)):
+                self._trie.insert(" ".join(words[i:]), station_id)
+            for alias in station.aliases:
+                self._trie.insert(alias, station_id)
+            self._trie.insert(station.crs.lower(), station_id)
+
+        for station_id, station in enumerate(self.stations):
+            name = station.name.lower()
+            grams = {name[i:i + n] for n in (1, 2, 3) for i in range(len(name) - n + 1)}
+            for gram in grams:
+                self._ngrams.setdefault(gram, []).append(station_id)
+
+        # trigram index over the names, same order as self.stations, for typo-tolerant suggestions
+        self._fuzzy = TrigramIndex([station.name for station in self.stations], max_candidates=32)
+
+    # --- lookups ---
+    def is_crs(self, code):
+        return code.strip().upper() in self.by_crs
+
+    def station(self, crs):
+        return self.by_crs.get(crs)
+
+    def code_for_name(self, text):
+        """CRS for an exact station name (case-insensitive), else None."""
+        return self.by_name.get(text.strip().lower())
+
+    def resolve(self, text):
+        """CRS for a CRS code, station name, alias or linked TIPLOC; None if none of those match."""
+        if not text:
+            return None
+        code = text.strip().upper()
+        if code in self.by_crs:
+            return code
+        lower = text.strip().lower()
+        return self.by_name.get(lower) or self.by_alias.get(lower) or self.tiploc_to_crs.get(code)
+
+    def darwin_codes(self, code):
+        """TIPLOCs to use for `code` in Darwin data: the linked ones for a CRS, itself for a TIPLOC."""
+        code = code.strip().upper()
+        if code in self.tiplocs:
+            return [code]
+        station = self.by_crs.get(code)
+        return list(station.tiplocs) if station else []
+
+    def complete(self, prefix, limit=10):
+        """Stations whose name, a later word of it, an alias or the CRS starts with `prefix`."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        return [self.stations[station_id] for station_id in self._trie.complete(prefix, limit)]
+
+    def find_substring(self, query):
+        """(lowercase name, CRS) for every station whose name contains `query`, in file order."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        if len(query) <= 3:
+            candidates = self._ngrams.get(query, [])
+        else:
+            postings = [self._ngrams.get(query[i:i + 3], []) for i in range(len(query) - 2)]
+            smallest = min(postings, key=len)
+            others = [set(posting) for posting in postings if posting is not smallest]
+            candidates = [station_id for station_id in smallest if all(station_id in other for other in others)]
+        matches = []
+        for station_id in candidates:
+            name = self.stations[station_id].name.lower()
+            if query in name:
+                matches.append((name, self.stations[station_id].crs))
+        return matches
+
+    def suggest(self, query, limit=8):
+        """Ranked type-ahead suggestions for `query` as dicts with name, crs and how they matched.
+
+        Exact CRS or name first, then name and word prefixes from the trie, then,
+        if that leaves room, stations sharing the most trigrams with the query.
+        """
+        query = query.strip().lower()
+        if not query or limit <= 0:
+            return []
+        ranked = []
+        exact = self.resolve(query)
+        if exact in self.by_crs:
+            ranked.append((exact, "exact"))
+        for station in self.complete(query, limit + 1):
+            ranked.append((station.crs, "prefix"))
+        if len(ranked) < limit and len(query) >= MIN_FUZZY_QUERY:
+            for index in self._fuzzy.candidates(query)[:limit]:
+                ranked.append((self.stations[index].crs, "fuzzy"))
+
+        suggestions, seen = [], set()
+        for crs, match in ranked:
+            if crs in seen:
+                continue
+            seen.add(crs)
+            suggestions.append({"name": self.by_crs[crs].name, "crs": crs, "match": match})
+            if len(suggestions) == limit:
+                break
+        return suggestions
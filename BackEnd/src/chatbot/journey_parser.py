@@ -0,0 +1,229 @@
+# imports:
+import re
+import sys
+import time
+import random
+
+# the patterns extract_journey_details used to run in sequence, kept as the reference grammar for the fuzz check
+LEGACY_PATTERN = r'(?:.*?from\s+)([\w\s]+?)(?:\s+to\s+)([\w\s]+?)(?:(?:\s+at\s+)([\w\s:]+?))?(?:(?:\s+on\s+)([\w\s]+?))?(?:\s+|$)'
+LEGACY_ALT_PATTERN = r'(?:.*?)(?:from\s+)?([\w\s]+?)(?:\s+to\s+)([\w\s]+?)(?:\s+(tomorrow|today))?(?:\s+at\s+([\w\s:]+))?(?:\s+|$)'
+
+# a whitespace-delimited "to" followed by a one-word destination that ends at whitespace or the end of the text
+SEPARATOR = re.compile(r"(?<=\s)to\s+(\w+)(?!\S)")
+SPACES = re.compile(r"\s+")
+AT_TIME = re.compile(r"\s+at\s+([\w:]+)(?!\S)")
+ON_DAY = re.compile(r"\s+on\s+(\w+)(?!\S)")
+RELATIVE_DAY = re.compile(r"\s+(tomorrow|today)(?!\S)")
+AT_TIME_PHRASE = re.compile(r"\s+at\s+([\w:]+(?:\s+[\w:]+)*)(?!\S)")
+# origins cannot cross anything outside [\w\s]
+WORD_OR_SPACE_RUN = re.compile(r"[\w\s]+")
+PUNCTUATION_RUN = re.compile(r"[^\w\s]+")
+
+
+class NextMatch:
+    """First match of `pattern` starting at or after a position, for positions that only move forward.
+
+    The last match is kept and reused while it is still ahead, so a whole
+    parse searches the text at most once.
+    """
+
+    def __init__(self, pattern, text):
+        self.pattern = pattern
+        self.text = text
+        self.match = None
+        self.exhausted = False
+
+    def at_or_after(self, position):
+        if self.exhausted:
+            return None
+        if self.match is None or self.match.start() < position:
+            self.match = self.pattern.search(self.text, position)
+            self.exhausted = self.match is None
+        return self.match
+
+
+def _run_end(text, start, separator):
+    """Where the [\w\s] run starting here stops, read no further than the separator."""
+    run = WORD_OR_SPACE_RUN.match(text, start, separator.start())
+    return run.end() if run else start
+
+
+def _main_match(text):
+    """LEGACY_PATTERN: first "from" that reaches a " to ", one-word destination, optional " at " time and " on " day."""
+    separators = NextMatch(SEPARATOR, text)
+    position = text.find("from")
+    while position != -1:
+        spaces = SPACES.match(text, position + 4)
+        if not spaces:
+            position = text.find("from", position + 1)
+            continue
+        origin_start = spaces.end()
+        # at least one origin character and one whitespace character before the "to"
+        separator = separators.at_or_after(origin_start + 2)
+        if separator is None:
+            return None
+        stop = _run_end(text, origin_start, separator)
+        if stop == separator.start():
+            time_text = day_text = None
+            tail = separator.end()
+            at_time = AT_TIME.match(text, tail)
+            if at_time:
+                time_text, tail = at_time.group(1), at_time.end()
+            on_day = ON_DAY.match(text, tail)
+            if on_day:
+                day_text = on_day.group(1)
+            return text[origin_start:separator.start()].strip(), separator.group(1), time_text, day_text
+        # every "from" before the punctuation that cut this origin off is cut off by it too
+        position = text.find("from", stop)
+    return None
+
+
+def _alt_match(text):
+    """LEGACY_ALT_PATTERN: origin from the first word-or-space run that reaches a " to ", then today/tomorrow and time."""
+    separators = NextMatch(SEPARATOR, text)
+    position = 0
+    while True:
+        punctuation = PUNCTUATION_RUN.match(text, position)
+        if punctuation:
+            position = punctuation.end()
+        separator = separators.at_or_after(position + 2)
+        if separator is None:
+            return None
+        stop = _run_end(text, position, separator)
+        if stop == separator.start():
+            break
+        position = stop
+
+    origin_start = position
+    # a leading "from" is left out of the origin when the rest still reaches a " to "
+    spaces = SPACES.match(text, position + 4) if text.startswith("from", position) else None
+    if spaces:
+        later = separators.at_or_after(spaces.end() + 2)
+        if later is not None and _run_end(text, spaces.end(), later) == later.start():
+            origin_start, separator = spaces.end(), later
+    day_text = time_text = None
+    tail = separator.end()
+    relative_day = RELATIVE_DAY.match(text, tail)
+    if relative_day:
+        day_text, tail = relative_day.group(1), relative_day.end()
+    at_time = AT_TIME_PHRASE.match(text, tail)
+    if at_time:
+        time_text = at_time.group(1)
+    return text[origin_start:separator.start()].strip(), separator.group(1), day_text, time_text
+
+
+def parse_journey_text(text):
+    """(origin, destination, time_text, day_text) from lowercased, stripped text, or None.
+
+    Tries the grammar of LEGACY_PATTERN, then that of LEGACY_ALT_PATTERN (the
+    third pattern extract_journey_details tried can only match where the first
+    already did). Values are stripped, and a value has to be whole words: the
+    old regexes' backtracking corner cases, like a captured run of whitespace,
+    are not reproduced. Each step is a forward regex search over the text, so
+    a parse is linear in the message length instead of the cubic backtracking
+    the old patterns hit on long inputs without a usable " to ", and it stops
+    as soon as no separator is left ahead.
+    """
+    if SEPARATOR.search(text) is None:
+        return None
+    match = _main_match(text)
+    if match:
+        return match
+    match = _alt_match(text)
+    if match:
+        origin, destination, day_text, time_text = match
+        return origin, destination, time_text, day_text
+    return None
+
+
+def legacy_parse(text):
+    """The old regex cascade, for comparisons."""
+    match = re.search(LEGACY_PATTERN, text)
+    if match:
+        return match.groups()
+    match = re.search(LEGACY_ALT_PATTERN, text)
+    if match:
+        origin, destination, day_text, time_text = match.groups()
+        return origin, destination, time_text, day_text
+    return None
+
+
+# --- fuzz check and benchmark: python journey_parser.py [n_fuzz_cases] ---
+FUZZ_TOKENS = [
+    "from", "to", "at", "on", "train", "today", "tomorrow", "norwich", "london", "a", "b",
+    "5", "5:30", "5pm", "friday", "todays", "fromto", "?", "!", ",", "'", ":", "-",
+]
+# single whitespace characters: with longer runs the old regexes capture bare whitespace, which is not reproduced
+FUZZ_GAPS = [" ", " ", " ", "", "\t", "\n"]
+
+
+def _fuzz_text(rng, max_tokens=20):
+    parts = []
+    for _ in range(rng.randint(1, max_tokens)):
+        parts.append(rng.choice(FUZZ_TOKENS))
+        parts.append(rng.choice(FUZZ_GAPS))
+    return "".join(parts).lower().strip()
+
+
+def _stripped(match):
+    """A legacy result with stripped values, as parse_journey_text returns them."""
+    return None if match is None else tuple(value.strip() if value is not None else None for value in match)
+
+
+def fuzz(n_cases=20000, seed=7):
+    """Compare parse_journey_text with the legacy regexes on random short messages; returns the mismatches."""
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(n_cases):
+        text = _fuzz_text(rng)
+        if parse_journey_text(text) != _stripped(legacy_parse(text)):
+            mismatches.append(text)
+    return mismatches
+
+
+ADVERSARIAL_INPUTS = {
+    "no separator": lambda n: ("a " * n) + "?",
+    "from, no separator": lambda n: "from " + ("a " * n) + "?",
+    "separators, no destination": lambda n: "from " + ("a to " * n) + "?",
+    "long valid journey": lambda n: "from " + ("a " * n) + "to b at 5 on friday",
+}
+
+
+def benchmark(sizes=(100, 200, 400, 1000, 10000, 100000), legacy_limit=5.0):
+    from keyword_matcher import sample_corpus
+
+    corpus = [message.lower().strip() for message in sample_corpus()]
+    for name, parse in (("legacy regexes", legacy_parse), ("single-pass parser", parse_journey_text)):
+        start = time.perf_counter()
+        for message in corpus:
+            parse(message)
+        print(f"{name:>20} {(time.perf_counter() - start) / len(corpus) * 1e6:8.1f} us/message on sample traffic")
+
+    # inputs with no usable " to " make the regexes backtrack over every split of the text
+    for name, build in ADVERSARIAL_INPUTS.items():
+        print(f"\n{name}")
+        print(f"{'words':>8} {'parser ms':>11} {'legacy ms':>11}")
+        previous = None     # (size, seconds) of the last timed legacy run
+        for size in sizes:
+            text = build(size).lower().strip()
+            start = time.perf_counter()
+            parse_journey_text(text)
+            parser = time.perf_counter() - start
+            legacy = None
+            # skip the old regexes where cubic growth from the last run would take longer than legacy_limit
+            if previous is None or previous[1] * (size / previous[0]) ** 3 <= legacy_limit:
+                start = time.perf_counter()
+                legacy_parse(text)
+                legacy = time.perf_counter() - start
+                previous = (size, legacy)
+            legacy_text = f"{legacy * 1000:>11.2f}" if legacy is not None else f"{'skipped':>11}"
+            print(f"{size:>8} {parser * 1000:>11.2f} {legacy_text}")
+
+
+if __name__ == "__main__":
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    failures = fuzz(cases)
+    print(f"fuzz: {cases - len(failures)}/{cases} random messages parse the same as the legacy regexes")
+    for text in failures[:10]:
+        print(f"  {text!r}: parser={parse_journey_text(text)!r} legacy={legacy_parse(text)!r}")
+    benchmark()
@@ -0,0 +1,200 @@
+# imports:
+import sys
+import time
+import random
+import threading
+from collections import deque
+
+
+class KeywordHits(dict):
+    """Every keyword found in one message -> the start position of its first occurrence.
+
+    A plain dict underneath, so `keyword in hits` and the set operations on
+    hits.keys() run in C.
+    """
+
+    __slots__ = ()
+
+    def any(self, keywords):
+        """Same as any(keyword in text for keyword in keywords)."""
+        return not self.keys().isdisjoint(keywords)
+
+    def first(self, keywords):
+        """The keyword of `keywords` that occurs earliest in the text (None if none do)."""
+        found = [(self[keyword], keyword) for keyword in keywords if keyword in self]
+        return min(found)[1] if found else None
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds every registered keyword in one pass over a message.
+
+    Matching has the same substring semantics as `keyword in text`, so callers
+    can swap their `in` scans for lookups in the returned KeywordHits. The scan
+    is a Python loop per character, so it only pays off for large vocabularies:
+    at the chat turn's ~80 keywords the short-circuiting `in` scans in
+    chatbot_main/turn_pipeline are as fast and stay on the hot path, from a few
+    hundred keywords on the scan wins by a growing margin (see the benchmark). Keywords
+    can be added by any module at import time; the automaton is (re)compiled
+    lazily on the next scan. Transitions are precomputed for every state and
+    character (a DFA), so the scan is one dict lookup per character, plus one
+    list index to see whether the state ends any keyword.
+    """
+
+    def __init__(self, keywords=()):
+        self._keywords = []
+        self._known = set()
+        self._lock = threading.Lock()
+        self._compiled = None
+        self.add(keywords)
+
+    def add(self, keywords):
+        with self._lock:
+            for keyword in keywords:
+                if keyword and keyword not in self._known:
+                    self._known.add(keyword)
+                    self._keywords.append(keyword)
+                    self._compiled = None
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def _compile(self):
+        # trie of all keywords
+        children, outputs = [{}], [[]]
+        for keyword in self._keywords:
+            state = 0
+            for char in keyword:
+                if char not in children[state]:
+                    children.append({})
+                    outputs.append([])
+                    children[state][char] = len(children) - 1
+                state = children[state][char]
+            outputs[state].append(keyword)
+
+        # breadth-first failure links, folded into full transition tables and merged outputs
+        fail = [0] * len(children)
+        delta = [None] * len(children)
+        delta[0] = dict(children[0])
+        queue = deque(children[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(children[state])
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for char, child in children[state].items():
+                fail[child] = delta[fail[state]].get(char, 0) if state else 0
+                queue.append(child)
+        # (keyword, length) per state that ends keywords, None for the rest
+        return delta, [tuple((keyword, len(keyword)) for keyword in output) or None for output in outputs]
+
+    def compiled(self):
+        compiled = self._compiled
+        if compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = self._compile()
+                compiled = self._compiled
+        return compiled
+
+    def scan(self, text):
+        """KeywordHits for every occurrence of every keyword in `text`."""
+        delta, outputs = self.compiled()
+        hits = KeywordHits()
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = delta[state].get(char, 0)
+            if outputs[state] is not None:
+                for keyword, length in outputs[state]:
+                    if keyword not in hits:
+                        hits[keyword] = end - length
+        return hits
+
+
+# --- benchmark: python keyword_matcher.py [messages.txt] ---
+SAMPLE_TEMPLATES = [
+    "hi", "hello there", "thanks, bye", "what can you do?", "who are you",
+    "how much is a ticket from {a} to {b}", "will my train from {a} to {b} be late",
+    "predict delay from {a} to {b} at {t} on {d}", "i want to book an off-peak return from {a} to {b} on {d}",
+    "cheapest adult single {a} to {b} {d} {t}", "{a}", "{t}", "{d}", "single", "child anytime return please",
+    "any delay between {a} and {b} this {d} evening?", "price of a ticket to {b} at {t}",
+]
+SAMPLE_STATIONS = ["norwich", "london", "london liverpool street", "cambridge", "leeds", "birmingham new street", "york"]
+SAMPLE_DAYS = ["monday", "friday", "saturday", "sunday", "tomorrow"]
+
+
+def sample_corpus(n_messages=20000, seed=42):
+    """Chat messages shaped like real traffic, used when no message log is given."""
+    rng = random.Random(seed)
+    return [
+        rng.choice(SAMPLE_TEMPLATES).format(
+            a=rng.choice(SAMPLE_STATIONS), b=rng.choice(SAMPLE_STATIONS),
+            t=f"{rng.randrange(24):02d}:{rng.choice(['00', '15', '30', '45'])}", d=rng.choice(SAMPLE_DAYS),
+        )
+        for _ in range(n_messages)
+    ]
+
+
+def benchmark(path=None):
+    from chatbot_main import match_intent, intents, INTENT_FALLBACKS
+
+    if path:
+        with open(path, "r", encoding="utf-8") as file:
+            corpus = [line.strip().lower() for line in file if line.strip()]
+    else:
+        corpus = sample_corpus()
+    total_chars = sum(len(message) for message in corpus)
+
+    # the intent keywords with the priority match_intent checks them in, lowest wins
+    priorities = {}
+    for priority, (tag, patterns) in enumerate(
+        [(intent["tag"], intent["patterns"]) for intent in intents["intents"]] + INTENT_FALLBACKS
+    ):
+        for pattern in patterns:
+            priorities.setdefault(pattern, (priority, tag))
+    keyword_matcher = KeywordMatcher(priorities)
+
+    def automaton_intent(message):
+        matched = [priorities[keyword] for keyword in keyword_matcher.scan(message) if keyword in priorities]
+        return min(matched)[1] if matched else "unknown"
+
+    # best of several interleaved rounds, single rounds are noisy on a busy machine
+    keyword_matcher.compiled()
+    legacy = automaton = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for message in corpus:
+            match_intent(message)
+        legacy = min(legacy, time.perf_counter() - start)
+        start = time.perf_counter()
+        for message in corpus:
+            automaton_intent(message)
+        automaton = min(automaton, time.perf_counter() - start)
+
+    mismatches = sum(automaton_intent(message) != match_intent(message) for message in corpus)
+    print(f"{len(corpus)} messages, {total_chars / len(corpus):.1f} chars on average, {len(keyword_matcher)} keywords")
+    for name, seconds in (("match_intent scans", legacy), ("one automaton pass", automaton)):
+        print(f"{name:>20} {len(corpus) / seconds:>12,.0f} msg/s {total_chars / seconds / 1e6:>8.2f} MB/s")
+    print(f"intent mismatches: {mismatches}")
+
+    # a scan costs the same however many keywords there are, `in` loops grow with the vocabulary
+    from resources import get_gazetteer
+    names = [station.name.lower() for station in get_gazetteer().stations]
+    sample = corpus[:2000]
+    print("\nkeywords   in-loop msg/s   automaton msg/s")
+    for size in (len(keyword_matcher), 500, len(keyword_matcher) + len(names)):
+        vocabulary = (list(keyword_matcher._keywords) + names)[:size]
+        matcher = KeywordMatcher(vocabulary)
+        matcher.compiled()
+        start = time.perf_counter()
+        for message in sample:
+            [keyword for keyword in vocabulary if keyword in message]
+        loops = time.perf_counter() - start
+        start = time.perf_counter()
+        for message in sample:
+            matcher.scan(message)
+        scans = time.perf_counter() - start
+        print(f"{size:>8} {len(sample) / loops:>15,.0f} {len(sample) / scans:>17,.0f}")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,68 @@
+# imports:
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe, size-bounded memo table with least-recently-used eviction and hit/latency stats.
+
+    `lookup(key, compute)` returns the cached value or computes and stores it.
+    The computation runs outside the lock, so two threads missing on the same
+    key may both compute it; the values are deterministic so either one is kept.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clears = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key, compute):
+        start = time.perf_counter()
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                value = self._data[key]
+                self.hits += 1
+                self.hit_seconds += time.perf_counter() - start
+                return value
+
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.clears += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "clears": self.clears,
+                "mean_hit_ms": round(self.hit_seconds * 1000 / self.hits, 4) if self.hits else None,
+                "mean_miss_ms": round(self.miss_seconds * 1000 / self.misses, 4) if self.misses else None,
+            }
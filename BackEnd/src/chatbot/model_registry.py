@@ -0,0 +1,252 @@
+# imports:
+import os
+import json
+import time
+import pickle
+import signal
+import threading
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "ml_model"))
+VERSIONS_DIR_NAME = "versions"
+ACTIVE_FILE_NAME = "ACTIVE"
+MODEL_FILE_NAME = "model.pkl"
+META_FILE_NAME = "meta.json"
+
+# version name used for a bare ml_model/model.pkl written before the registry existed:
+LEGACY_VERSION = "legacy"
+
+# feature order of models whose meta.json does not list their features:
+LEGACY_FEATURES = ["station_deviation", "day_of_week", "hour", "on_peak"]
+
+
+class ModelBundle:
+    """A loaded, warmed-up model together with the version it was loaded from."""
+
+    def __init__(self, version, model, meta=None):
+        self.version = version
+        self.model = model
+        self.meta = meta or {}
+        self.features = list(self.meta.get("features") or LEGACY_FEATURES)
+        self.loaded_at = time.time()
+
+    def predict(self, features):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return self.model.predict(features)
+
+
+class ModelRegistry:
+    """Versioned model bundles on disk plus the one the running process is serving.
+
+    Layout under `model_dir`:
+        versions/<version>/model.pkl
+        versions/<version>/meta.json
+        ACTIVE                         name of the version to serve
+
+    Swaps are atomic from the point of view of request handlers: a new bundle is
+    fully loaded and warmed up before it replaces the active reference, and any
+    request that already pinned the old bundle keeps using it until it finishes.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.versions_dir = os.path.join(model_dir, VERSIONS_DIR_NAME)
+        self.active_path = os.path.join(model_dir, ACTIVE_FILE_NAME)
+        self._active = None
+        self._swap_lock = threading.Lock()
+        self._local = threading.local()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.swap_count = 0
+        self.last_error = None
+
+    # --- on-disk versions ---
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if os.path.isfile(os.path.join(self.versions_dir, name, MODEL_FILE_NAME))
+        )
+
+    def active_version_on_disk(self):
+        """Version named in the ACTIVE file, the legacy model, or None."""
+        try:
+            with open(self.active_path, "r") as file:
+                version = file.read().strip()
+            if version:
+                return version
+        except OSError:
+            pass
+        if os.path.isfile(os.path.join(self.model_dir, MODEL_FILE_NAME)):
+            return LEGACY_VERSION
+        return None
+
+    def _model_path(self, version):
+        if version == LEGACY_VERSION:
+            return os.path.join(self.model_dir, MODEL_FILE_NAME)
+        return os.path.join(self.versions_dir, version, MODEL_FILE_NAME)
+
+    def _new_version_name(self):
+        base = datetime.now().strftime("%Y%m%d-%H%M%S")
+        version, suffix = base, 1
+        while os.path.exists(os.path.join(self.versions_dir, version)):
+            suffix += 1
+            version = f"{base}-{suffix}"
+        return version
+
+    def publish(self, model, meta=None, activate=True):
+        """Write a new version to disk and optionally make it the one servers should load."""
+        os.makedirs(self.versions_dir, exist_ok=True)
+        version = self._new_version_name()
+        tmp_dir = os.path.join(self.versions_dir, f".{version}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, MODEL_FILE_NAME), "wb") as file:
+            pickle.dump(model, file)
+        meta = dict(meta or {}, version=version, created_at=datetime.now().isoformat(timespec="seconds"))
+        with open(os.path.join(tmp_dir, META_FILE_NAME), "w") as file:
+            json.dump(meta, file, indent=2)
+        # the version only becomes visible once it is complete:
+        os.replace(tmp_dir, os.path.join(self.versions_dir, version))
+        if activate:
+            self.set_active_on_disk(version)
+        return version
+
+    def set_active_on_disk(self, version):
+        if version != LEGACY_VERSION and version not in self.list_versions():
+            raise ValueError(f"Unknown model version: {version}")
+        tmp_path = self.active_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(version + "\n")
+        os.replace(tmp_path, self.active_path)
+
+    # --- loading and swapping ---
+    def load(self, version):
+        """Load a version and warm it up with one prediction so the first real request is not slower."""
+        with open(self._model_path(version), "rb") as file:
+            model = pickle.load(file)
+        meta = {}
+        meta_path = os.path.join(self.versions_dir, version, META_FILE_NAME)
+        if os.path.isfile(meta_path):
+            with open(meta_path, "r") as file:
+                meta = json.load(file)
+        bundle = ModelBundle(version, model, meta)
+        n_features = getattr(model, "n_features_in_", len(meta.get("features", [])) or 4)
+        bundle.predict(np.zeros((1, n_features)))
+        return bundle
+
+    def reload(self, version=None):
+        """Load `version` (default: the ACTIVE file) and swap it in. Returns the serving version."""
+        with self._swap_lock:
+            version = version or self.active_version_on_disk()
+            if version is None:
+                raise FileNotFoundError(f"No trained model found in {self.model_dir}, run train_model.py first")
+            return self._swap_to(version)
+
+    def activate(self, version):
+        """Load and swap in `version`, then name it in ACTIVE. A version that fails to load never reaches
+        the file, so neither the watcher nor the next restart picks it up."""
+        with self._swap_lock:
+            if version != LEGACY_VERSION and version not in self.list_versions():
+                raise ValueError(f"Unknown model version: {version}")
+            self._swap_to(version)
+            self.set_active_on_disk(version)
+            return version
+
+    def _swap_to(self, version):
+        # caller holds the swap lock
+        if self._active is not None and self._active.version == version:
+            return version
+        try:
+            bundle = self.load(version)
+        except Exception as e:
+            # keep serving the old model if the new one is broken:
+            self.last_error = f"{version}: {e}"
+            raise
+        self._active = bundle
+        self.swap_count += 1
+        self.last_error = None
+        return version
+
+    def active(self):
+        """The bundle to use for this request: the pinned one inside request_scope(), else the current one."""
+        pinned = getattr(self._local, "bundle", None)
+        if pinned is not None:
+            return pinned
+        bundle = self._active
+        if bundle is None:
+            self.reload()
+            bundle = self._active
+        return bundle
+
+    def active_version(self):
+        return self.active().version
+
+    @contextmanager
+    def request_scope(self):
+        """Pin the current bundle for the duration of one request so a concurrent swap cannot split it."""
+        outer = getattr(self._local, "bundle", None)
+        bundle = outer or self.active()
+        self._local.bundle = bundle
+        try:
+            yield bundle
+        finally:
+            self._local.bundle = outer
+
+    def status(self):
+        bundle = self._active
+        return {
+            "active_version": bundle.version if bundle else None,
+            "loaded_at": bundle.loaded_at if bundle else None,
+            "version_on_disk": self.active_version_on_disk(),
+            "available_versions": self.list_versions(),
+            "swap_count": self.swap_count,
+            "last_error": self.last_error,
+        }
+
+    # --- swap triggers ---
+    def _reload_quietly(self):
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"Model reload failed: {e}")
+
+    def start_watcher(self, interval=2.0):
+        """Poll the ACTIVE file and swap whenever it names a different version."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                version = self.active_version_on_disk()
+                current = self._active.version if self._active else None
+                if version and version != current:
+                    self._reload_quietly()
+
+        self._watcher = threading.Thread(target=watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+        self._watcher = None
+
+    def install_signal_handler(self, signum=getattr(signal, "SIGHUP", None)):
+        """Reload on a signal (SIGHUP by default). Only possible from the main thread and on POSIX."""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+
+        def handle(_signum, _frame):
+            # never load a model inside the signal handler itself:
+            threading.Thread(target=self._reload_quietly, name="model-registry-reload", daemon=True).start()
+
+        signal.signal(signum, handle)
+        return True
+
+
+# process-wide registry shared by the chatbot and the API:
+registry = ModelRegistry()
@@ -1,54 +1,62 @@
+import os
 import re
 from datetime import datetime
-import os
-from thefuzz import process, fuzz
-import pytz
+from lru import LRUCache
+from journey_parser import parse_journey_text
+from resources import get_station_vocabulary, get_fuzzy_index, get_journey_extractor, get_gazetteer
+
+# Common UK station names and codes
+DEFAULT_STATION_MAPPING = {
+    "birmingham": "BHM",
+    "london": "LST",
+    "euston": "EUS",
+    "manchester": "MAN",
+    "liverpool": "LIV",
+    "edinburgh": "EDB",
+    "glasgow": "GLC",
+    "norwich": "NRW",
+    "cambridge": "CBG",
+    "oxford": "OXF",
+    "york": "YRK",
+    "newcastle": "NCL",
+    "leeds": "LDS",
+    "bristol": "BRI",
+    "cardiff": "CDF",
+    "stratford": "SRA",
+    "watford": "WAT",
+    "brighton": "BTN"
+}
+
+# entries kept in the per-extractor memo tables, most recently used phrasings survive
+JOURNEY_CACHE_SIZE = int(os.environ.get("JOURNEY_CACHE_SIZE", 2048))
+STATION_CACHE_SIZE = int(os.environ.get("STATION_CACHE_SIZE", 4096))
 
 class JourneyExtractor:
+    # number of extractors built in this process, should stay at 1 (see resources.py)
+    instances_created = 0
+
     def __init__(self, debug=False):
         """Initialize the journey extractor with station data."""
+        # pytz is only needed once the extractor is built, keep it off the import path
+        import pytz
+
+        JourneyExtractor.instances_created += 1
         self.debug = debug
         self.uk_timezone = pytz.timezone('Europe/London')
         self.today = datetime.now(self.uk_timezone)
         
-        # Common UK station names and codes
-        self.station_mapping = {
-            "birmingham": "BHM",
-            "london": "LST",
-            "euston": "EUS",
-            "manchester": "MAN",
-            "liverpool": "LIV",
-            "edinburgh": "EDB",
-            "glasgow": "GLC",
-            "norwich": "NRW",
-            "cambridge": "CBG",
-            "oxford": "OXF",
-            "york": "YRK",
-            "newcastle": "NCL",
-            "leeds": "LDS",
-            "bristol": "BRI",
-            "cardiff": "CDF",
-            "stratford": "SRA",
-            "watford": "WAT",
-            "brighton": "BTN"
-        }
-        
-        # Load station codes from dataFile.txt
-        data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataFile.txt"))
-        try:
-            with open(data_path, 'r') as file:
-                for line in file:
-                    parts = line.strip().split(',')
-                    if len(parts) > 1:
-                        # Add station codes to our mapping
-                        self.station_mapping[parts[0].lower()] = parts[0]
-                        self.station_mapping[parts[1].lower()] = parts[1]
-        except:
-            # File loading failed, continue with default mapping
-            pass
+        # Station names and codes from dataFile.txt, loaded once per process and shared read-only
+        self.station_mapping = get_station_vocabulary()
+
+        # Trigram index over the deduplicated station codes, used for exact and fuzzy matching
+        self.station_data = get_fuzzy_index()
+
+        # Shared names, aliases, CRS codes and TIPLOCs, so matches come back as CRS codes where one is known
+        self.gazetteer = get_gazetteer()
 
-        # Now build station_data
-        self.station_data = list(self.station_mapping.values())
+        # Memo tables keyed by the normalised input, the journey one is cleared when the date changes
+        self.journey_cache = LRUCache(JOURNEY_CACHE_SIZE)
+        self.station_cache = LRUCache(STATION_CACHE_SIZE)
 
         # Special time mappings
         self.time_keywords = {
@@ -78,13 +86,33 @@ class JourneyExtractor:
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         return days[tomorrow_idx]
     
+    def _refresh_today(self):
+        """Move "today"/"tomorrow" on after midnight, the extractor lives as long as the process."""
+        now = datetime.now(self.uk_timezone)
+        if now.date() == self.today.date():
+            return
+        self.today = now
+        self.day_mapping = dict(self.day_mapping, today=now.strftime("%A"), tomorrow=self._get_tomorrow())
+        # cached journeys may have resolved "today"/"tomorrow" against the old date
+        self.journey_cache.clear()
+
+    def cache_stats(self):
+        return {"journey": self.journey_cache.stats(), "station": self.station_cache.stats()}
+
     def _log(self, message):
         """Conditionally print debug messages."""
         if self.debug:
             print(f"Debug: {message}")
     
     def match_station(self, station_text):
-        """Match station name using improved fuzzy matching."""
+        """Match station name using improved fuzzy matching (memoised per cleaned input)."""
+        if not station_text:
+            return None
+        station_text = station_text.strip().upper()
+        return self.station_cache.lookup(station_text, lambda: self._match_station(station_text))
+
+    def _match_station(self, station_text):
+        """Uncached match_station."""
         if not station_text:
             return None
             
@@ -107,16 +135,21 @@ class JourneyExtractor:
         if station_text in station_mappings:
             return station_mappings[station_text]
             
+        # Check for a CRS code, full station name, alias or linked TIPLOC
+        code = self.gazetteer.resolve(station_text)
+        if code:
+            return code
+
         # Check for exact match in station data
         if station_text in self.station_data:
             return station_text
             
-        # Try fuzzy matching with LOWER threshold (65 instead of 75/80)
-        matches = process.extract(station_text, self.station_data, limit=3)
+        # Try fuzzy matching with LOWER threshold (65 instead of 75/80), only scoring indexed candidates
+        matches = self.station_data.extract(station_text, limit=3)
         for match, score in matches:
             if score >= 65:  # Lower threshold for better matching
                 self._log(f"Fuzzy matched '{station_text}' to '{match}' with score {score}")
-                return match
+                return self.gazetteer.resolve(match) or match
                 
         # If all else fails, return the input to allow flow to continue
         return station_text
@@ -169,43 +202,23 @@ class JourneyExtractor:
         return None
     
     def extract_journey_details(self, text):
-        """Extract journey details from user input."""
+        """Extract journey details from user input (memoised per normalised text)."""
+        self._refresh_today()
         text = text.lower().strip()
+        # hand out a copy, callers may add to the dict they get back
+        return dict(self.journey_cache.lookup(text, lambda: self._extract_journey_details(text)))
+
+    def _extract_journey_details(self, text):
+        """Uncached extract_journey_details over already normalised text."""
         result = {}
-        
-        # Main pattern that properly handles the components
-        pattern = r'(?:.*?from\s+)([\w\s]+?)(?:\s+to\s+)([\w\s]+?)(?:(?:\s+at\s+)([\w\s:]+?))?(?:(?:\s+on\s+)([\w\s]+?))?(?:\s+|$)'
-        
-        # Alternative patterns
-        alt_patterns = [
-            # "Delay Birmingham to London tomorrow at 5"
-            r'(?:.*?)(?:from\s+)?([\w\s]+?)(?:\s+to\s+)([\w\s]+?)(?:\s+(tomorrow|today))?(?:\s+at\s+([\w\s:]+))?(?:\s+|$)',
-            
-            # "Will my train from X to Y be late?"
-            r'(?:.*?train\s+from\s+)([\w\s]+?)(?:\s+to\s+)([\w\s]+?)(?:\s+.*?)?(?:\s+|$)'
-        ]
-        
-        # Try main pattern first
-        match = re.search(pattern, text)
-        if match:
-            origin, destination, time_text, day_text = match.groups()
-        else:
-            # Try alternative patterns
-            for alt_pattern in alt_patterns:
-                match = re.search(alt_pattern, text)
-                if match:
-                    # Handle different group structures
-                    groups = match.groups()
-                    if len(groups) == 4:  # Pattern with tomorrow/today
-                        origin, destination, day_text, time_text = groups
-                    elif len(groups) == 2:  # Simple pattern
-                        origin, destination = groups
-                        time_text, day_text = None, None
-                    break
-            else:
-                self._log("No pattern match found")
-                return {}
-        
+
+        # the journey grammar (from X to Y at T on D, or X to Y today/tomorrow at T) in one linear-time scan
+        match = parse_journey_text(text)
+        if match is None:
+            self._log("No pattern match found")
+            return {}
+        origin, destination, time_text, day_text = match
+
         # Clean up extraction results
         if origin:
             origin = origin.strip()
@@ -233,8 +246,6 @@ class JourneyExtractor:
         return result
 
 
-extractor = JourneyExtractor(debug=False)
-
 # Updated extract_train_info function to extract ticket details
 def extract_train_info(text, existing_info=None):
     """Extract train journey and ticket details using JourneyExtractor."""
@@ -242,7 +253,7 @@ def extract_train_info(text, existing_info=None):
     result = existing_info or {}
     
     # Extract new information
-    journey_info = extractor.extract_journey_details(text)
+    journey_info = get_journey_extractor().extract_journey_details(text)
     
     # Basic journey info
     for key in ["origin", "destination", "departure_time", "departure_day"]:
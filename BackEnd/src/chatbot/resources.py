@@ -0,0 +1,161 @@
+# imports:
+import os
+import threading
+import time
+
+# set up absolute path to dataFile.txt:
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataFile.txt"))
+
+
+class ResourceRegistry:
+    """Process-wide, build-once store for the expensive read-only objects the chatbot shares.
+
+    Each resource has a factory that runs at most once (per-resource lock, so two
+    different resources can build concurrently). Everything handed out is shared
+    between request threads and must be treated as read-only by callers.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._values = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        self.build_counts = {}
+        self.build_seconds = {}
+        self.request_counts = {}
+
+    def register(self, name, factory):
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+            self.build_counts.setdefault(name, 0)
+            self.request_counts.setdefault(name, 0)
+
+    def get(self, name):
+        self.request_counts[name] += 1
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._values:
+                start = time.perf_counter()
+                self._values[name] = self._factories[name]()
+                self.build_seconds[name] = time.perf_counter() - start
+                self.build_counts[name] += 1
+        return self._values[name]
+
+    def is_built(self, name):
+        return name in self._values
+
+    def stats(self):
+        return {
+            name: {
+                "built": name in self._values,
+                "builds": self.build_counts[name],
+                "requests": self.request_counts[name],
+                "build_seconds": round(self.build_seconds.get(name, 0.0), 4),
+            }
+            for name in self._factories
+        }
+
+
+# --- factories ---
+def _build_station_vocabulary():
+    """Lowercase name/code -> station code, the hardcoded major stations plus every Darwin location."""
+    from nlpprocessor import DEFAULT_STATION_MAPPING
+
+    station_mapping = dict(DEFAULT_STATION_MAPPING)
+    try:
+        with open(data_path, "r") as file:
+            for line in file:
+                parts = line.strip().split(",")
+                if len(parts) > 1:
+                    station_mapping[parts[0].lower()] = parts[0]
+                    station_mapping[parts[1].lower()] = parts[1]
+    except OSError:
+        # File loading failed, continue with default mapping
+        pass
+    return station_mapping
+
+
+def _build_fuzzy_index():
+    # trigram index over the deduplicated station codes, see fuzzy_index.py
+    from fuzzy_index import TrigramIndex
+    return TrigramIndex(resources.get("station_vocabulary").values())
+
+
+def _build_model_station_ids():
+    """Station -> id used for the delay model's station_deviation feature."""
+    stations = set()
+    with open(data_path, "r") as file:
+        for line in file:
+            parts = line.strip().split(",")
+            if len(parts) > 1:
+                stations.add(parts[0])
+                stations.add(parts[1])
+    return {station: idx for idx, station in enumerate(stations)}
+
+
+def _build_gazetteer():
+    """Station names, aliases, CRS codes and the Darwin TIPLOCs linked to them, see gazetteer.py."""
+    from gazetteer import Gazetteer
+    from nlpprocessor import DEFAULT_STATION_MAPPING
+
+    return Gazetteer(tiplocs=resources.get("model_station_ids"), aliases=DEFAULT_STATION_MAPPING)
+
+
+def _build_spatial_index():
+    """KD-tree and precomputed distance matrix over the gazetteer's station coordinates, see spatial.py."""
+    from spatial import SpatialIndex
+    return SpatialIndex(resources.get("gazetteer").stations)
+
+
+def _build_route_schedules():
+    """Calling-point sequences rebuilt from the Darwin rows, see route_profile.py; pandas only loads here."""
+    from data_cache import load_training_frame
+    from route_profile import RouteSchedules
+    return RouteSchedules(load_training_frame(data_path))
+
+
+def _build_journey_extractor():
+    from nlpprocessor import JourneyExtractor
+    return JourneyExtractor(debug=False)
+
+
+resources = ResourceRegistry()
+resources.register("station_vocabulary", _build_station_vocabulary)
+resources.register("fuzzy_index", _build_fuzzy_index)
+resources.register("journey_extractor", _build_journey_extractor)
+resources.register("model_station_ids", _build_model_station_ids)
+resources.register("gazetteer", _build_gazetteer)
+resources.register("spatial_index", _build_spatial_index)
+resources.register("route_schedules", _build_route_schedules)
+
+
+def get_station_vocabulary():
+    return resources.get("station_vocabulary")
+
+
+def get_fuzzy_index():
+    return resources.get("fuzzy_index")
+
+
+def get_journey_extractor():
+    return resources.get("journey_extractor")
+
+
+def get_model_station_ids():
+    return resources.get("model_station_ids")
+
+
+def get_gazetteer():
+    return resources.get("gazetteer")
+
+
+def get_spatial_index():
+    return resources.get("spatial_index")
+
+
+def get_route_schedules():
+    return resources.get("route_schedules")
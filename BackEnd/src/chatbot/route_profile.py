@@ -0,0 +1,111 @@
+# imports:
+import os
+from collections import Counter, defaultdict
+
+# set up absolute path to dataFile.txt:
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataFile.txt"))
+
+# a gap this long between two calls of one block of Darwin rows starts a new run:
+RUN_BREAK_MINUTES = 60
+# a stop reported again within this long is the same call (arrival then departure), later it is another service:
+DWELL_MINUTES = 10
+
+
+class NoStoredSchedule(LookupError):
+    """No stored run calls at the origin and then at the destination."""
+
+
+class RouteSchedules:
+    """Calling-point sequences reconstructed from the Darwin rows in dataFile.txt.
+
+    Each row is (service origin, calling point, scheduled, actual, date) with no
+    train id. Darwin writes a train's calls together, so each block of consecutive
+    rows with the same origin and date is read as one service's messages; a block
+    is cut into runs where a stop comes back after more than DWELL_MINUTES or the
+    timetable has a gap over RUN_BREAK_MINUTES. Runs whose first call is not the
+    service origin are fragments (Darwin did not report the departure) and are
+    dropped, so every offset is measured from a scheduled departure. Runs of one
+    origin, date and departure time are merged, as a service is often reported in
+    several blocks. A run is a list of (stop, minutes after the origin's departure).
+
+    Limitation: a block that interleaves two services of the same origin can still
+    produce a run mixing their calls; stops_between() takes the most common
+    sequence so such runs rarely decide a profile, but offsets are schedule-based
+    estimates, not a timetable.
+    """
+
+    def __init__(self, frame):
+        self.runs = []
+        # stop -> indexes of the runs calling there
+        self.runs_by_stop = defaultdict(set)
+        self.fragments = 0
+        self._build(frame)
+
+    def _build(self, frame):
+        origins = frame["origin"].astype(str)
+        dates = frame["date"].astype(str)
+        scheduled = frame["sched_dt"].dt.hour * 60 + frame["sched_dt"].dt.minute + frame["sched_dt"].dt.second / 60.0
+        blocks = ((origins != origins.shift()) | (dates != dates.shift())).cumsum()
+        calls_by_block = {}
+        for block, origin, date, stop, minute in zip(blocks, origins, dates, frame["destination"].astype(str), scheduled):
+            calls_by_block.setdefault(block, (origin, date, set()))[2].add((minute, stop))
+
+        services = {}    # (origin, date, departure minute) -> {stop: minute}
+        for origin, date, calls in calls_by_block.values():
+            run, first_seen, last_minute = [], {}, None
+            for minute, stop in sorted(calls):
+                if stop in first_seen and minute - first_seen[stop] <= DWELL_MINUTES:
+                    continue
+                if run and (stop in first_seen or minute - last_minute > RUN_BREAK_MINUTES):
+                    self._collect(services, origin, date, run)
+                    run, first_seen = [], {}
+                run.append((stop, minute))
+                first_seen[stop] = minute
+                last_minute = minute
+            if run:
+                self._collect(services, origin, date, run)
+
+        for calls in services.values():
+            self._add_run(sorted(calls.items(), key=lambda call: call[1]))
+
+    def _collect(self, services, origin, date, run):
+        if run[0][0] != origin:
+            self.fragments += 1
+            return
+        calls = services.setdefault((origin, date, run[0][1]), {})
+        for stop, minute in run:
+            calls[stop] = min(minute, calls.get(stop, minute))
+
+    def _add_run(self, calls):
+        start = calls[0][1]
+        run = [(stop, minute - start) for stop, minute in calls]
+        index = len(self.runs)
+        self.runs.append(run)
+        for stop, _ in run:
+            self.runs_by_stop[stop].add(index)
+
+    def stops_between(self, origin, destination):
+        """Calling points after `origin` up to and including `destination`, as (stop, minutes from origin).
+
+        Uses the most common stop sequence among the stored runs that call at
+        `origin` before `destination`. Returns None if no run serves the pair.
+        """
+        candidates = self.runs_by_stop.get(origin, set()) & self.runs_by_stop.get(destination, set())
+        sequences = Counter()
+        offsets = {}
+        for index in candidates:
+            run = self.runs[index]
+            stops = [stop for stop, _ in run]
+            start, end = stops.index(origin), stops.index(destination)
+            if start >= end:
+                continue
+            leg = tuple(stop for stop, _ in run[start + 1:end + 1])
+            sequences[leg] += 1
+            offsets.setdefault(leg, [minute - run[start][1] for _, minute in run[start + 1:end + 1]])
+        if not sequences:
+            return None
+        # most frequent sequence, longest on ties so no known stop is skipped:
+        leg = max(sequences, key=lambda seq: (sequences[seq], len(seq)))
+        return list(zip(leg, offsets[leg]))
+
+
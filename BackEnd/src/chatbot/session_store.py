@@ -0,0 +1,828 @@
+# imports:
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+
+# sessions idle for longer than this are dropped
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 30 * 60))
+# when full, the least recently used session makes room for a new one
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 10000))
+# messages (user and bot) kept per session, older ones fall off the front
+SESSION_HISTORY_LIMIT = int(os.environ.get("SESSION_HISTORY_LIMIT", 50))
+
+# shared backends: where they live, how many decoded conversations each worker keeps, how often they are swept
+SESSION_DB_PATH = os.environ.get(
+    "SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3")
+)
+SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 1024))
+SESSION_SWEEP_SECONDS = float(os.environ.get("SESSION_SWEEP_SECONDS", 60))
+# a turn whose save lost a race with another worker is answered again from the newer state this many times
+SESSION_SAVE_RETRIES = int(os.environ.get("SESSION_SAVE_RETRIES", 3))
+
+
+class SessionConflict(Exception):
+    """Another worker saved the session after this turn read it; the turn's changes were not written."""
+
+
+class SessionLocks:
+    """One lock per session id, so turns of a session run one at a time while different sessions run in parallel.
+
+    Locks are created on first use and dropped once nobody holds or waits
+    for them, so the table only ever holds the sessions with a turn in flight.
+    """
+
+    def __init__(self):
+        self._locks = {}    # session_id -> [lock, threads holding or waiting]
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def hold(self, session_id):
+        with self._lock:
+            entry = self._locks.get(session_id)
+            if entry is None:
+                entry = self._locks[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        start = time.perf_counter()
+        contended = not entry[0].acquire(blocking=False)
+        if contended:
+            entry[0].acquire()
+        waited = time.perf_counter() - start
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[session_id]
+                self.acquired += 1
+                self.contended += contended
+                self.wait_seconds += waited
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._locks),
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "mean_wait_ms": round(self.wait_seconds * 1000 / self.acquired, 3) if self.acquired else None,
+            }
+
+
+class SessionStore:
+    """Interface every conversation store implements.
+
+    A conversation is the dict chatbot_main keeps per session_id (state,
+    journey_info, history, ...). `get` returns it for in-place changes and
+    marks the session as active; stores that do not hand out live objects
+    persist those changes in `save`, which chatbot_main calls once per turn.
+    A turn holds `lock(session_id)` from its first `get` to its `save`; a save
+    that finds the session changed by another worker since raises SessionConflict.
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS, history_limit=SESSION_HISTORY_LIMIT):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.history_limit = history_limit
+        self.locks = SessionLocks()
+
+    def lock(self, session_id):
+        """Context manager serialising turns of one session within this process."""
+        return self.locks.hold(session_id)
+
+    def new_conversation(self, conversation):
+        """Fill in the fields the store manages: the last_interaction time and a bounded history."""
+        conversation["last_interaction"] = time.time()
+        conversation["history"] = deque(conversation.get("history", ()), maxlen=self.history_limit)
+        return conversation
+
+    def create(self, conversation, session_id=None):
+        """Store a new conversation, under `session_id` or a fresh UUID, and return its id."""
+        raise NotImplementedError
+
+    def get(self, session_id):
+        """The live conversation for `session_id`, None if it is unknown or has expired."""
+        raise NotImplementedError
+
+    def save(self, session_id, conversation):
+        """Persist changes made to a conversation returned by `get`."""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store: an OrderedDict kept in least-recently-used order.
+
+    Because every access moves a session to the end, expired sessions are
+    always at the front, so sweeping them is proportional to the number that
+    expired rather than to the number of sessions. Sweeps happen on access,
+    no background thread is needed.
+    """
+
+    backend = "memory"
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.deleted = 0
+
+    def _sweep(self, now):
+        # caller holds the lock
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if now - conversation["last_interaction"] <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def create(self, conversation, session_id=None):
+        session_id = session_id or str(uuid.uuid4())
+        conversation = self.new_conversation(conversation)
+        with self._lock:
+            self._sweep(conversation["last_interaction"])
+            self._sessions.pop(session_id, None)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session_id] = conversation
+            self.created += 1
+        return session_id
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            conversation = self._sessions.get(session_id)
+            if conversation is not None:
+                conversation["last_interaction"] = now
+                self._sessions.move_to_end(session_id)
+        return conversation
+
+    def save(self, session_id, conversation):
+        # conversations are live objects, changes are already in the store
+        pass
+
+    def delete(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self.deleted += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            self._sweep(time.time())
+            conversations = list(self._sessions.values())
+            counters = {"created": self.created, "expired": self.expired, "evicted": self.evicted, "deleted": self.deleted}
+        history = sum(len(conversation.get("history", ())) for conversation in conversations)
+        return {
+            "backend": self.backend,
+            "sessions": len(conversations),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "history_limit": self.history_limit,
+            "history_messages": history,
+            "approx_bytes": sum(conversation_size(conversation) for conversation in conversations),
+            **counters,
+            "locks": self.locks.stats(),
+        }
+
+
+def conversation_size(value):
+    """Rough deep size in bytes of a conversation dict (containers and the strings/numbers inside)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(conversation_size(key) + conversation_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, deque, set)):
+        size += sum(conversation_size(item) for item in value)
+    return size
+
+
+class SharedSessionStore(SessionStore):
+    """Base for stores shared by several worker processes or hosts.
+
+    Conversations are kept remotely as compact JSON records, each tagged with
+    a random etag that changes on every save. Every worker keeps the decoded
+    conversations it served recently in a bounded local cache; a read only
+    fetches the etag and reuses the cached object when it is unchanged, so
+    the record is transferred and decoded again only after another worker
+    saved it. Expired records are invisible to reads; expiry and the session
+    cap are enforced by a sweep that runs at most every `sweep_interval`
+    seconds, so the cap can be exceeded briefly in between.
+
+    While a thread holds `lock(session_id)` the conversation it read is pinned:
+    every `get` of that thread returns the same object, whatever the local
+    cache evicts, and `save` writes it only if the record still carries the
+    etag it was read with (compare-and-swap), raising SessionConflict if
+    another worker saved in between.
+
+    Subclasses implement the primitives: _read_etag, _read, _write, _remove,
+    _sweep_expired and _count.
+    """
+
+    backend = None
+
+    def __init__(self, cache_size=SESSION_CACHE_SIZE, sweep_interval=SESSION_SWEEP_SECONDS, **settings):
+        super().__init__(**settings)
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        self._cache = OrderedDict()     # session_id -> (etag, conversation)
+        self._pinned = {}   # session_id -> [thread holding the session lock, etag, conversation] for turns in flight
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.deleted = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.conflicts = 0
+
+    # --- records ---
+    @staticmethod
+    def encode(conversation):
+        return json.dumps(conversation, separators=(",", ":"), default=list)
+
+    def decode(self, record):
+        conversation = json.loads(record)
+        conversation["history"] = deque(conversation.get("history", ()), maxlen=self.history_limit)
+        return conversation
+
+    def _remember(self, session_id, etag, conversation):
+        with self._lock:
+            self._cache[session_id] = (etag, conversation)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    def _pin(self, session_id):
+        # caller holds self._lock; the pin of the current thread's turn on this session, if any
+        pin = self._pinned.get(session_id)
+        return pin if pin is not None and pin[0] == threading.get_ident() else None
+
+    @contextmanager
+    def lock(self, session_id):
+        with self.locks.hold(session_id):
+            with self._lock:
+                self._pinned[session_id] = [threading.get_ident(), None, None]
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._pinned.pop(session_id, None)
+
+    # --- SessionStore ---
+    def create(self, conversation, session_id=None):
+        session_id = session_id or str(uuid.uuid4())
+        conversation = self.new_conversation(conversation)
+        self.sweep(conversation["last_interaction"])
+        self.save(session_id, conversation)
+        self.created += 1
+        return session_id
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            pin = self._pin(session_id)
+            if pin is not None and pin[2] is not None:
+                # the rest of a turn works on the object its first get returned
+                pin[2]["last_interaction"] = now
+                return pin[2]
+        etag = self._read_etag(session_id, now - self.ttl_seconds)
+        if etag is None:
+            self._forget(session_id)
+            return None
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[0] == etag:
+                self._cache.move_to_end(session_id)
+                self.cache_hits += 1
+                conversation = cached[1]
+            else:
+                self.cache_misses += 1
+                conversation = None
+        if conversation is None:
+            found = self._read(session_id, now - self.ttl_seconds)
+            if found is None:
+                self._forget(session_id)
+                return None
+            etag, record = found
+            conversation = self.decode(record)
+            self._remember(session_id, etag, conversation)
+        with self._lock:
+            pin = self._pin(session_id)
+            if pin is not None:
+                pin[1], pin[2] = etag, conversation
+        # written back with the rest of the conversation by save()
+        conversation["last_interaction"] = now
+        return conversation
+
+    def save(self, session_id, conversation):
+        # the etag the conversation was read with; None for a new one, which may only replace an expired record
+        with self._lock:
+            pin = self._pin(session_id)
+            cached = self._cache.get(session_id)
+            if pin is not None and pin[2] is conversation:
+                expected = pin[1]
+            elif cached is not None and cached[1] is conversation:
+                expected = cached[0]
+            else:
+                expected = None
+        record = self.encode(conversation)
+        etag = uuid.uuid4().hex
+        last_interaction = conversation["last_interaction"]
+        if not self._write(session_id, record, etag, last_interaction, expected, time.time() - self.ttl_seconds):
+            with self._lock:
+                self.conflicts += 1
+                self._cache.pop(session_id, None)
+                if pin is not None:
+                    # the retry reads the newer record
+                    pin[1] = pin[2] = None
+            raise SessionConflict(session_id)
+        self._remember(session_id, etag, conversation)
+        with self._lock:
+            if pin is not None:
+                pin[1], pin[2] = etag, conversation
+            self.writes += 1
+            self.bytes_written += len(record)
+
+    def delete(self, session_id):
+        self._forget(session_id)
+        if self._remove(session_id):
+            self.deleted += 1
+
+    def sweep(self, now=None, force=False):
+        """Drop expired records and trim to max_sessions, at most once per sweep_interval unless forced."""
+        now = now or time.time()
+        if not force and now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        expired, evicted = self._sweep_expired(now - self.ttl_seconds, self.max_sessions)
+        self.expired += expired
+        self.evicted += evicted
+
+    def stats(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "backend": self.backend,
+            "sessions": self._count(time.time() - self.ttl_seconds),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "history_limit": self.history_limit,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "deleted": self.deleted,
+            "local_cache": {
+                "size": len(self._cache),
+                "maxsize": self.cache_size,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": round(self.cache_hits / lookups, 4) if lookups else None,
+            },
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "mean_record_bytes": round(self.bytes_written / self.writes, 1) if self.writes else None,
+            "locks": self.locks.stats(),
+        }
+
+
+class SQLiteSessionStore(SharedSessionStore):
+    """Sessions in one SQLite file (WAL mode), shared by every worker process on the host."""
+
+    backend = "sqlite"
+
+    def __init__(self, path=SESSION_DB_PATH, **settings):
+        super().__init__(**settings)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, etag TEXT NOT NULL, last_interaction REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_last_interaction ON sessions (last_interaction)")
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads, so each thread opens its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _read_etag(self, session_id, oldest):
+        row = self._connection().execute(
+            "SELECT etag FROM sessions WHERE session_id = ? AND last_interaction >= ?", (session_id, oldest)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _read(self, session_id, oldest):
+        row = self._connection().execute(
+            "SELECT etag, record FROM sessions WHERE session_id = ? AND last_interaction >= ?", (session_id, oldest)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _write(self, session_id, record, etag, last_interaction, expected, oldest):
+        with self._connection() as connection:
+            if expected is None:
+                # a new conversation may take over an expired row, never a live one
+                cursor = connection.execute(
+                    "INSERT INTO sessions (session_id, record, etag, last_interaction) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET record = excluded.record, etag = excluded.etag, "
+                    "last_interaction = excluded.last_interaction WHERE sessions.last_interaction < ?",
+                    (session_id, record, etag, last_interaction, oldest),
+                )
+            else:
+                cursor = connection.execute(
+                    "UPDATE sessions SET record = ?, etag = ?, last_interaction = ? WHERE session_id = ? AND etag = ?",
+                    (record, etag, last_interaction, session_id, expected),
+                )
+            return cursor.rowcount == 1
+
+    def _remove(self, session_id):
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def _sweep_expired(self, oldest, max_sessions):
+        with self._connection() as connection:
+            expired = connection.execute("DELETE FROM sessions WHERE last_interaction < ?", (oldest,)).rowcount
+            evicted = connection.execute(
+                "DELETE FROM sessions WHERE session_id IN "
+                "(SELECT session_id FROM sessions ORDER BY last_interaction DESC LIMIT -1 OFFSET ?)",
+                (max_sessions,),
+            ).rowcount
+        return expired, evicted
+
+    def _count(self, oldest):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_interaction >= ?", (oldest,)
+        ).fetchone()[0]
+
+
+class RedisSessionStore(SharedSessionStore):
+    """Sessions in Redis, shared by workers on any host.
+
+    Each session is a hash (etag, record) that Redis expires by itself after
+    the TTL; a sorted set of session ids by last interaction is used to
+    enforce the session cap. `SESSION_REDIS_URL=local://` uses LocalRedis,
+    an in-process stand-in, instead of a server.
+    """
+
+    backend = "redis"
+    KEY_PREFIX = "chatbot:session:"
+    INDEX_KEY = "chatbot:sessions"
+
+    def __init__(self, url=SESSION_REDIS_URL, client=None, **settings):
+        super().__init__(**settings)
+        if client is None:
+            if url.startswith("local://"):
+                client = LocalRedis()
+            else:
+                # optional dependency, only needed for this backend
+                import redis
+                client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        if isinstance(client, LocalRedis):
+            self.watch_error = LocalRedis.WatchError
+        else:
+            from redis.exceptions import WatchError
+            self.watch_error = WatchError
+
+    def _key(self, session_id):
+        return self.KEY_PREFIX + session_id
+
+    def _read_etag(self, session_id, oldest):
+        return self.client.hget(self._key(session_id), "etag")
+
+    def _read(self, session_id, oldest):
+        found = self.client.hmget(self._key(session_id), ["etag", "record"])
+        return tuple(found) if found[0] is not None else None
+
+    def _write(self, session_id, record, etag, last_interaction, expected, oldest):
+        # expired records are gone in Redis, so a new conversation just needs the key to be absent
+        key = self._key(session_id)
+        with self.client.pipeline() as pipeline:
+            try:
+                pipeline.watch(key)
+                if pipeline.hget(key, "etag") != expected:
+                    return False
+                pipeline.multi()
+                pipeline.hset(key, mapping={"etag": etag, "record": record})
+                pipeline.expire(key, max(1, int(self.ttl_seconds)))
+                pipeline.zadd(self.INDEX_KEY, {session_id: last_interaction})
+                pipeline.execute()
+                return True
+            except self.watch_error:
+                return False
+
+    def _remove(self, session_id):
+        pipeline = self.client.pipeline()
+        pipeline.delete(self._key(session_id))
+        pipeline.zrem(self.INDEX_KEY, session_id)
+        return pipeline.execute()[0] > 0
+
+    def _sweep_expired(self, oldest, max_sessions):
+        # the records expire by themselves, only the index needs cleaning up
+        expired = self.client.zremrangebyscore(self.INDEX_KEY, "-inf", oldest)
+        excess = self.client.zcard(self.INDEX_KEY) - max_sessions
+        evicted = 0
+        if excess > 0:
+            dropped = [session_id for session_id, _ in self.client.zpopmin(self.INDEX_KEY, excess)]
+            evicted = self.client.delete(*[self._key(session_id) for session_id in dropped])
+        return expired, evicted
+
+    def _count(self, oldest):
+        return self.client.zcount(self.INDEX_KEY, oldest, "+inf")
+
+
+class LocalRedis:
+    """In-process stand-in for the few redis-py calls RedisSessionStore makes (decode_responses=True semantics)."""
+
+    class WatchError(Exception):
+        pass
+
+    def __init__(self):
+        self._data = {}
+        self._expiry = {}
+        self._versions = {}     # key -> number of changes, what WATCH compares
+        self._lock = threading.RLock()
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _live(self, key):
+        deadline = self._expiry.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+            self._touch(key)
+        return self._data.get(key)
+
+    def hget(self, key, field):
+        with self._lock:
+            return (self._live(key) or {}).get(field)
+
+    def hmget(self, key, fields):
+        with self._lock:
+            found = self._live(key) or {}
+            return [found.get(field) for field in fields]
+
+    def hset(self, key, mapping):
+        with self._lock:
+            self._data.setdefault(key, {}).update(mapping)
+            self._touch(key)
+            return len(mapping)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._expiry[key] = time.time() + seconds
+            self._touch(key)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = sum(self._live(key) is not None for key in keys)
+            for key in keys:
+                self._data.pop(key, None)
+                self._expiry.pop(key, None)
+                self._touch(key)
+            return removed
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            scores = self._data.setdefault(key, {})
+            added = sum(member not in scores for member in mapping)
+            scores.update(mapping)
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            scores = self._data.get(key, {})
+            return sum(scores.pop(member, None) is not None for member in members)
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._data.get(key, {}))
+
+    def zcount(self, key, low, high):
+        low, high = float(low), float(high)
+        with self._lock:
+            return sum(low <= score <= high for score in self._data.get(key, {}).values())
+
+    def zremrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        with self._lock:
+            scores = self._data.get(key, {})
+            dropped = [member for member, score in scores.items() if low <= score <= high]
+            for member in dropped:
+                del scores[member]
+            return len(dropped)
+
+    def zpopmin(self, key, count=1):
+        with self._lock:
+            scores = self._data.get(key, {})
+            popped = sorted(scores.items(), key=lambda item: item[1])[:count]
+            for member, _ in popped:
+                del scores[member]
+            return popped
+
+    def pipeline(self):
+        return LocalRedisPipeline(self)
+
+
+class LocalRedisPipeline:
+    """Queues LocalRedis calls and runs them together on execute(), like a redis-py pipeline.
+
+    After watch() calls run straight away until multi(); execute() then raises
+    LocalRedis.WatchError if a watched key changed since it was watched.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+        self._watched = None    # key -> version when watched, None when not watching
+        self._immediate = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        self._calls, self._watched, self._immediate = [], None, False
+
+    def watch(self, *keys):
+        with self._client._lock:
+            self._watched = {key: self._client._versions.get(key, 0) for key in keys}
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        if self._immediate:
+            return method
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            watched = self._watched or {}
+            if any(self._client._versions.get(key, 0) != version for key, version in watched.items()):
+                self.reset()
+                raise LocalRedis.WatchError("watched key changed")
+            results = [method(*args, **kwargs) for method, args, kwargs in self._calls]
+        self.reset()
+        return results
+
+
+# backends selectable with SESSION_BACKEND, other modules can add their own
+SESSION_BACKENDS = {"memory": MemorySessionStore, "sqlite": SQLiteSessionStore, "redis": RedisSessionStore}
+
+
+def register_backend(name, factory):
+    SESSION_BACKENDS[name] = factory
+
+
+def create_session_store(backend=None, **settings):
+    backend = backend or os.environ.get("SESSION_BACKEND", "memory")
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown session backend '{backend}', expected one of {sorted(SESSION_BACKENDS)}")
+    return SESSION_BACKENDS[backend](**settings)
+
+
+sessions = create_session_store()
+
+
+# --- stress test: python session_store.py [backend] ---
+def _stress(store, guard, n_sessions, n_threads, turns_per_thread, io_seconds, seed=42, workers=None):
+    """Threads run turns on random sessions; returns (turns per second, lost updates, save conflicts).
+
+    A turn reads a counter from the conversation, waits like a turn waiting
+    on a fare lookup would, and writes back the value it read plus one, so
+    any interleaving of two turns on one session loses an update. A save
+    that raises SessionConflict is retried like chatbot_main does. `workers`
+    are (store, guard) pairs standing in for other processes sharing the backend.
+    """
+    import random
+
+    session_ids = [store.create({"state": "GREETING", "journey_info": {}, "turns": 0}) for _ in range(n_sessions)]
+    workers = workers or [(store, guard)]
+    conflicts = [0]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        worker_store, worker_guard = workers[index % len(workers)]
+        for _ in range(turns_per_thread):
+            session_id = rng.choice(session_ids)
+            while True:
+                with worker_guard(session_id):
+                    conversation = worker_store.get(session_id)
+                    turns = conversation["turns"]
+                    time.sleep(io_seconds)
+                    conversation["turns"] = turns + 1
+                    conversation["history"].append({"role": "user", "message": "stress"})
+                    try:
+                        worker_store.save(session_id, conversation)
+                        break
+                    except SessionConflict:
+                        conflicts[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    counted = sum(store.get(session_id)["turns"] for session_id in session_ids)
+    for session_id in session_ids:
+        store.delete(session_id)
+    return n_threads * turns_per_thread / elapsed, n_threads * turns_per_thread - counted, conflicts[0]
+
+
+def stress_test(backend=None, n_sessions=200, turns_per_thread=40, io_seconds=0.002):
+    import tempfile
+
+    settings = {"max_sessions": n_sessions * 2}
+    if backend == "sqlite":
+        settings["path"] = os.path.join(tempfile.mkdtemp(), "stress.sqlite3")
+    elif backend == "redis":
+        settings["url"] = SESSION_REDIS_URL if len(sys.argv) > 2 else "local://"
+    store = create_session_store(backend or "memory", **settings)
+    global_lock = threading.Lock()
+
+    @contextmanager
+    def unguarded(session_id):
+        yield
+
+    guards = {
+        "no locking": unguarded,
+        "one global lock": lambda session_id: global_lock,
+        "per-session locks": store.lock,
+    }
+    print(f"{store.backend} backend, {n_sessions} sessions, {turns_per_thread} turns per thread, "
+          f"{io_seconds * 1000:.0f} ms of I/O per turn")
+    print(f"{'threads':>8} " + " ".join(f"{name:>26}" for name in guards))
+    for n_threads in (1, 4, 16, 64):
+        cells = []
+        for guard in guards.values():
+            throughput, lost, _ = _stress(store, guard, n_sessions, n_threads, turns_per_thread, io_seconds)
+            cells.append(f"{throughput:>9,.0f} turns/s {lost:>5} lost")
+        print(f"{n_threads:>8} " + " ".join(f"{cell:>26}" for cell in cells))
+    print(f"locks: {store.locks.stats()}")
+
+    # many threads on a handful of sessions: every turn on a session has to wait for the previous one
+    throughput, lost, _ = _stress(store, store.lock, 4, 64, turns_per_thread, io_seconds)
+    print(f"64 threads on 4 sessions with per-session locks: {throughput:,.0f} turns/s, {lost} lost")
+
+    # two workers sharing the backend: their locks don't see each other, the compare-and-swap saves do
+    if isinstance(store, SharedSessionStore):
+        shared = {"path": store.path} if backend == "sqlite" else {"client": store.client}
+        other = create_session_store(backend, **dict(settings, **shared))
+        throughput, lost, conflicts = _stress(store, None, 4, 64, turns_per_thread, io_seconds,
+                                              workers=[(store, store.lock), (other, other.lock)])
+        print(f"2 workers, 64 threads on 4 sessions: {throughput:,.0f} turns/s, {lost} lost, {conflicts} saves retried")
+
+
+if __name__ == "__main__":
+    stress_test(sys.argv[1] if len(sys.argv) > 1 else None)
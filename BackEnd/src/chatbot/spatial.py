@@ -0,0 +1,164 @@
+# imports:
+import math
+import sys
+import time
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# distances are stored as uint16 tenths of a kilometre, enough for 6553.5 km at 50 m resolution
+DISTANCE_SCALE = 10
+
+# model feature values for stations without known coordinates: a distance no pair can have,
+# and a point far outside Great Britain
+UNKNOWN_DISTANCE_KM = -1.0
+UNKNOWN_COORDINATE = 0.0
+
+# rows of the distance matrix computed per numpy batch, bounds the float64 scratch memory
+MATRIX_BATCH_ROWS = 256
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; takes scalars or numpy arrays in degrees and broadcasts."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def unit_vectors(lat, lon):
+    """Points on the unit sphere, straight-line (chord) order there matches great-circle order."""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+class SpatialIndex:
+    """Nearest-station queries and pairwise distances over the stations_codes.csv coordinates.
+
+    Stations are held in a KD-tree over their unit-sphere positions, so k-nearest
+    and radius queries are exact great-circle queries without scanning every
+    station. All pairwise distances are also precomputed into an n x n uint16
+    matrix (tenths of a km, ~14 MB for the full station list) so model features
+    are a single lookup.
+    """
+
+    def __init__(self, stations):
+        # scipy is only needed once the index is built, keep it off the import path
+        from scipy.spatial import cKDTree
+
+        stations = [station for station in stations if station.lat is not None and station.lon is not None]
+        self.codes = [station.crs for station in stations]
+        self.names = [station.name for station in stations]
+        self.index_of = {code: i for i, code in enumerate(self.codes)}
+        self.lat = np.array([station.lat for station in stations], dtype=np.float64)
+        self.lon = np.array([station.lon for station in stations], dtype=np.float64)
+
+        self.tree = cKDTree(unit_vectors(self.lat, self.lon))
+        self.matrix = self._build_matrix()
+
+    def _build_matrix(self):
+        n = len(self.codes)
+        matrix = np.empty((n, n), dtype=np.uint16)
+        limit = np.iinfo(np.uint16).max
+        for start in range(0, n, MATRIX_BATCH_ROWS):
+            stop = min(start + MATRIX_BATCH_ROWS, n)
+            km = haversine_km(self.lat[start:stop, None], self.lon[start:stop, None], self.lat[None, :], self.lon[None, :])
+            matrix[start:stop] = np.minimum(np.rint(km * DISTANCE_SCALE), limit).astype(np.uint16)
+        return matrix
+
+    # --- distances ---
+    def distance_km(self, code_a, code_b):
+        """Precomputed distance between two CRS codes, None if either has no coordinates."""
+        i, j = self.index_of.get(code_a), self.index_of.get(code_b)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j]) / DISTANCE_SCALE
+
+    def distances_km(self, codes_a, codes_b, unknown=np.nan):
+        """Vectorised distance_km over two equal-length sequences of CRS codes."""
+        i = np.array([self.index_of.get(code, -1) for code in codes_a])
+        j = np.array([self.index_of.get(code, -1) for code in codes_b])
+        known = (i >= 0) & (j >= 0)
+        result = np.full(len(i), unknown, dtype=np.float64)
+        result[known] = self.matrix[i[known], j[known]] / DISTANCE_SCALE
+        return result
+
+    def coordinates(self, codes, unknown=UNKNOWN_COORDINATE):
+        """(lat, lon) arrays for a sequence of CRS codes, `unknown` where a code has no coordinates."""
+        i = np.array([self.index_of.get(code, -1) for code in codes])
+        known = i >= 0
+        lat, lon = np.full(len(i), unknown, dtype=np.float64), np.full(len(i), unknown, dtype=np.float64)
+        lat[known], lon[known] = self.lat[i[known]], self.lon[i[known]]
+        return lat, lon
+
+    # --- neighbourhood queries ---
+    def nearest(self, lat, lon, limit=5, radius_km=None):
+        """Up to `limit` stations nearest a point, optionally within `radius_km`, as dicts with crs, name and distance_km."""
+        limit = min(limit, len(self.codes))
+        if limit <= 0:
+            return []
+        bound = km_to_chord(radius_km) if radius_km is not None else np.inf
+        chords, indexes = self.tree.query(unit_vectors(lat, lon), k=limit, distance_upper_bound=bound)
+        chords, indexes = np.atleast_1d(chords), np.atleast_1d(indexes)
+        found = indexes < len(self.codes)
+        return [
+            {"crs": self.codes[i], "name": self.names[i], "distance_km": round(float(km), 2)}
+            for i, km in zip(indexes[found].tolist(), chord_to_km(chords[found]))
+        ]
+
+    def near_station(self, code, limit=5, radius_km=None):
+        """Stations nearest the station with CRS `code` (excluding itself), None if it is unknown."""
+        i = self.index_of.get(code)
+        if i is None:
+            return None
+        found = self.nearest(self.lat[i], self.lon[i], limit + 1, radius_km)
+        return [station for station in found if station["crs"] != code][:limit]
+
+
+# --- benchmark: python spatial.py [n_queries] ---
+def benchmark(n_queries=2000, seed=42):
+    """Compare KD-tree queries and matrix lookups with a full haversine scan."""
+    from resources import get_spatial_index
+
+    start = time.perf_counter()
+    index = get_spatial_index()
+    print(f"{len(index.codes)} stations, index + matrix built in {time.perf_counter() - start:.3f}s, "
+          f"matrix {index.matrix.nbytes / 1e6:.1f} MB")
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(index.codes), size=n_queries)
+
+    start = time.perf_counter()
+    for i in picks:
+        km = haversine_km(index.lat[i], index.lon[i], index.lat, index.lon)
+        np.argsort(km)[:6]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in picks:
+        index.near_station(index.codes[i], limit=5)
+    tree = time.perf_counter() - start
+
+    pairs = rng.integers(0, len(index.codes), size=(n_queries, 2))
+    start = time.perf_counter()
+    for i, j in pairs:
+        index.distance_km(index.codes[i], index.codes[j])
+    lookup = time.perf_counter() - start
+
+    exact = haversine_km(index.lat[pairs[:, 0]], index.lon[pairs[:, 0]], index.lat[pairs[:, 1]], index.lon[pairs[:, 1]])
+    stored = index.matrix[pairs[:, 0], pairs[:, 1]] / DISTANCE_SCALE
+    print(f"5 nearest, full scan  {scan / n_queries * 1e6:8.1f} us/query")
+    print(f"5 nearest, KD-tree    {tree / n_queries * 1e6:8.1f} us/query")
+    print(f"distance lookup       {lookup / n_queries * 1e6:8.1f} us/query")
+    print(f"max matrix error      {np.max(np.abs(exact - stored)) * 1000:8.1f} m")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,150 @@
+# imports:
+import os
+import re
+import sys
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from model_registry import registry
+from resources import resources
+
+# CHATBOT_STARTUP selects how heavy resources are loaded:
+#   lazy        nothing at boot, each resource is built by the first request that needs it (default)
+#   background  boot immediately and build everything in parallel threads, /ready reports progress
+#   eager       build everything in parallel before the server starts accepting requests
+STARTUP_MODES = ("lazy", "background", "eager")
+DEFAULT_STARTUP_MODE = "lazy"
+
+
+def _load_delay_model():
+    return registry.active().version
+
+
+# everything worth warming before the first chat turn
+PRELOAD_TASKS = {
+    "delay_model": _load_delay_model,
+    "journey_extractor": lambda: resources.get("journey_extractor"),
+    "model_station_ids": lambda: resources.get("model_station_ids"),
+    "gazetteer": lambda: resources.get("gazetteer"),
+    "spatial_index": lambda: resources.get("spatial_index"),
+    "route_schedules": lambda: resources.get("route_schedules"),
+}
+
+
+class Startup:
+    """Runs the preload tasks for the selected mode and tracks readiness."""
+
+    def __init__(self, tasks=PRELOAD_TASKS):
+        self.tasks = tasks
+        self.mode = None
+        self.started_at = None
+        self.status = {name: "pending" for name in tasks}
+        self.seconds = {}
+        self.errors = {}
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _run_task(self, name):
+        with self._lock:
+            self.status[name] = "loading"
+        start = time.perf_counter()
+        try:
+            self.tasks[name]()
+            state = "ready"
+        except Exception as e:
+            self.errors[name] = str(e)
+            state = "failed"
+        with self._lock:
+            self.seconds[name] = round(time.perf_counter() - start, 4)
+            self.status[name] = state
+
+    def _run_all(self, workers):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preload") as pool:
+            list(pool.map(self._run_task, self.tasks))
+        self._done.set()
+
+    def start(self, mode=None, workers=None):
+        mode = mode or os.environ.get("CHATBOT_STARTUP", DEFAULT_STARTUP_MODE)
+        if mode not in STARTUP_MODES:
+            raise ValueError(f"Unknown startup mode '{mode}', expected one of {STARTUP_MODES}")
+        self.mode = mode
+        self.started_at = time.time()
+        workers = workers or len(self.tasks)
+        if mode == "lazy":
+            self._done.set()
+        elif mode == "background":
+            threading.Thread(target=self._run_all, args=(workers,), name="preload", daemon=True).start()
+        else:
+            self._run_all(workers)
+        return self
+
+    def is_ready(self):
+        # lazy mode is always ready, the first requests just pay for what they touch
+        return self._done.is_set() and not self.errors
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def readiness(self):
+        with self._lock:
+            return {
+                "ready": self.is_ready(),
+                "mode": self.mode,
+                "uptime_seconds": round(time.time() - self.started_at, 3) if self.started_at else None,
+                "tasks": dict(self.status),
+                "task_seconds": dict(self.seconds),
+                "errors": dict(self.errors),
+            }
+
+
+startup = Startup()
+
+
+# --- import-time profile ---
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def profile_imports(module="chatbot_api", top=25):
+    """Import `module` in a fresh interpreter with -X importtime and return the slowest imports.
+
+    Returns (total_seconds, [(cumulative_us, self_us, module_name), ...]) sorted slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+    )
+    rows = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = int(match.group(1)), int(match.group(2)), match.group(3)
+        rows.append((cumulative_us, self_us, name))
+        if name == module:
+            total_us = cumulative_us
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows.sort(reverse=True)
+    return total_us / 1e6, rows[:top]
+
+
+def print_profile_report(module="chatbot_api", top=25):
+    total, rows = profile_imports(module, top)
+    print(f"import {module}: {total:.3f}s")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in rows:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    print("\npreload tasks (run one at a time):")
+    for name in PRELOAD_TASKS:
+        start = time.perf_counter()
+        PRELOAD_TASKS[name]()
+        print(f"{(time.perf_counter() - start) * 1000:>14.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    # python startup.py [module] prints where cold start time goes
+    print_profile_report(sys.argv[1] if len(sys.argv) > 1 else "chatbot_api")
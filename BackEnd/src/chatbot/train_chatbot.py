@@ -1,23 +1,15 @@
 # imports:
-import os
-import pickle
 import re
 import numpy as np
 from datetime import datetime
 from extra_features import get_random_weather, is_rush_hour
+from model_registry import registry, LEGACY_FEATURES
+from resources import get_journey_extractor, get_model_station_ids, get_gazetteer, get_spatial_index, get_route_schedules
+from route_profile import NoStoredSchedule
+from spatial import UNKNOWN_DISTANCE_KM
 
-# load trained model:
-model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "ml_model", "model.pkl"))
-with open(model_path, "rb") as file:
-    model = pickle.load(file)
-
-# load station mapping from training data:
-data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataFile.txt"))
-
-# read and get all unique stations:
-station_df = np.genfromtxt(data_path, delimiter=",", dtype=str)
-stations = set(station_df[:, 0]).union(set(station_df[:, 1]))
-station_to_id = {station: idx for idx, station in enumerate(stations)}
+# the trained model is served through the registry and loaded on first use (or by startup.py),
+# the station id map is built on first use by the resource registry
 
 # function to check peak hours:
 def is_peak(hour):
@@ -59,6 +51,7 @@ def extract_features_from_input(user_input):
         }
         day_of_week = day_map.get(day_str.lower(), now.weekday())
 
+    station_to_id = get_model_station_ids()
     if origin not in station_to_id or destination not in station_to_id:
         return None
 
@@ -67,14 +60,190 @@ def extract_features_from_input(user_input):
 
     return np.array([[station_deviation, day_of_week, hour, peak]])
 
+DAY_MAPPING = {
+    "Monday": 0, "Tuesday": 1, "Wednesday": 2,
+    "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6
+}
+
+# function to look up the model's id for a station given as a Darwin TIPLOC or a CRS code:
+def model_station_id(code, default=0):
+    station_to_id = get_model_station_ids()
+    if code in station_to_id:
+        return station_to_id[code]
+    # CRS codes from the chat flow map to the TIPLOCs the model was trained on
+    for tiploc in get_gazetteer().darwin_codes(code):
+        if tiploc in station_to_id:
+            return station_to_id[tiploc]
+    return default
+
+# function to look up the great-circle distance between two stations given as CRS codes or TIPLOCs:
+def station_distance_km(origin, destination):
+    gazetteer = get_gazetteer()
+    distance = get_spatial_index().distance_km(gazetteer.resolve(origin), gazetteer.resolve(destination))
+    return UNKNOWN_DISTANCE_KM if distance is None else distance
+
+# function to build the model feature row for one journey, in the order the serving model expects:
+def journey_feature_row(origin, destination, hour, day_of_week, features=LEGACY_FEATURES):
+    values = {"day_of_week": day_of_week, "hour": hour, "on_peak": is_peak(hour)}
+
+    if "distance_km" in features:
+        values["distance_km"] = station_distance_km(origin, destination)
+
+    if "origin_lat" in features or "destination_lat" in features:
+        gazetteer = get_gazetteer()
+        lat, lon = get_spatial_index().coordinates([gazetteer.resolve(origin), gazetteer.resolve(destination)])
+        values["origin_lat"], values["destination_lat"] = lat.tolist()
+        values["origin_lon"], values["destination_lon"] = lon.tolist()
+
+    if "station_deviation" in features:
+        # older models: id distance between the stations, use a lookup with default
+        origin_id = model_station_id(origin)
+        dest_id = model_station_id(destination)
+        if origin_id == 0 or dest_id == 0:
+            # Use a fallback estimation but DON'T print the debug message
+            values["station_deviation"] = 5  # Some reasonable default
+        else:
+            values["station_deviation"] = abs(origin_id - dest_id)
+
+    return [values[name] for name in features]
+
+# function to get the rule-based adjustment applied on top of the model output:
+def delay_adjustment(weather, hour, day_of_week):
+    adjustment = 0
+    if weather in {"heavy rain", "heavy snow", "thunderstorm", "stormy"}:
+        adjustment += 5
+    elif weather in {"sunny", "clear"}:
+        adjustment -= 2
+
+    if is_rush_hour(hour):
+        adjustment += 3
+
+    if day_of_week in (5, 6):  # Weekend adjustment
+        adjustment += 1
+    return adjustment
+
+# function to turn one structured journey into (hour, day_of_week), raising ValueError if invalid:
+def parse_journey_time(journey):
+    time_str = journey.get("time")
+    if time_str in (None, ""):
+        hour = datetime.now().hour
+    else:
+        try:
+            hour = datetime.strptime(str(time_str).strip(), "%H:%M").hour
+        except ValueError:
+            raise ValueError(f"Invalid time '{time_str}', expected HH:MM")
+
+    day = journey.get("day")
+    if day in (None, ""):
+        day_of_week = datetime.now().weekday()
+    elif isinstance(day, int) and 0 <= day <= 6:
+        day_of_week = day
+    elif isinstance(day, str) and day.strip().capitalize() in DAY_MAPPING:
+        day_of_week = DAY_MAPPING[day.strip().capitalize()]
+    else:
+        raise ValueError(f"Invalid day '{day}', expected a weekday name or 0-6")
+    return hour, day_of_week
+
+# batch prediction over structured journeys, one model call for the whole batch:
+def predict_delays(journeys):
+    """Predict delays for a list of {"origin", "destination", "time", "day", "weather"?} dicts.
+
+    Returns one result dict per journey in the same order. Invalid journeys get an
+    "error" instead of a prediction and do not fail the rest of the batch. Unlike the
+    chat flow, weather is only applied when the caller supplies it.
+    """
+    results = [None] * len(journeys)
+    bundle = registry.active()
+    rows, row_meta = [], []
+    for index, journey in enumerate(journeys):
+        if not isinstance(journey, dict):
+            results[index] = {"error": "Each journey must be an object"}
+            continue
+        origin = str(journey.get("origin") or "").strip().upper()
+        destination = str(journey.get("destination") or "").strip().upper()
+        if not origin or not destination:
+            results[index] = {"error": "origin and destination are required"}
+            continue
+        try:
+            hour, day_of_week = parse_journey_time(journey)
+        except ValueError as e:
+            results[index] = {"origin": origin, "destination": destination, "error": str(e)}
+            continue
+        rows.append(journey_feature_row(origin, destination, hour, day_of_week, bundle.features))
+        row_meta.append((index, origin, destination, hour, day_of_week, journey.get("weather")))
+
+    if rows:
+        predictions = bundle.predict(np.array(rows))
+        for (index, origin, destination, hour, day_of_week, weather), prediction in zip(row_meta, predictions):
+            adjusted = max(float(prediction) + delay_adjustment(weather, hour, day_of_week), 0.0)
+            results[index] = {
+                "origin": origin,
+                "destination": destination,
+                "hour": hour,
+                "day_of_week": day_of_week,
+                "predicted_delay_minutes": round(adjusted, 2),
+            }
+    return results
+
+# route profile: predicted delay at every calling point of one journey, one model call for all stops:
+def predict_route_profile(journey):
+    """Predict the delay at each stop between a journey's origin and destination.
+
+    `journey` has the same shape as a /predict item. Intermediate stops and the
+    minutes between them come from the schedules stored in dataFile.txt; stations
+    may be Darwin location codes or CRS codes linked to them in the gazetteer.
+    Raises ValueError if the journey is invalid, NoStoredSchedule if no stored schedule serves the pair.
+    """
+    origin = str(journey.get("origin") or "").strip().upper()
+    destination = str(journey.get("destination") or "").strip().upper()
+    if not origin or not destination:
+        raise ValueError("origin and destination are required")
+    hour, day_of_week = parse_journey_time(journey)
+    time_str = str(journey.get("time") or f"{hour:02d}:00").strip()
+    departure = hour * 60 + int(time_str.split(":")[1]) if ":" in time_str else hour * 60
+
+    gazetteer = get_gazetteer()
+    schedules = get_route_schedules()
+    # a CRS code can stand for several TIPLOCs, use the first pair a stored schedule serves
+    pairs = [(o, d) for o in gazetteer.darwin_codes(origin) or [origin]
+             for d in gazetteer.darwin_codes(destination) or [destination]]
+    stops, origin_tiploc = [], origin
+    for origin_tiploc, destination_tiploc in pairs:
+        stops = schedules.stops_between(origin_tiploc, destination_tiploc)
+        if stops:
+            break
+    if not stops:
+        raise NoStoredSchedule(f"No stored schedule from {origin} to {destination}")
+
+    bundle = registry.active()
+    rows, calls = [], []
+    for stop, offset in stops:
+        minute_of_week = day_of_week * 24 * 60 + departure + offset
+        stop_day = int(minute_of_week // (24 * 60)) % 7
+        stop_hour = int(minute_of_week % (24 * 60) // 60)
+        rows.append(journey_feature_row(origin_tiploc, stop, stop_hour, stop_day, bundle.features))
+        calls.append((stop, offset, stop_hour, stop_day))
+
+    predictions = bundle.predict(np.array(rows))
+    weather = journey.get("weather")
+    profile = []
+    for (stop, offset, stop_hour, stop_day), prediction in zip(calls, predictions):
+        adjusted = max(float(prediction) + delay_adjustment(weather, stop_hour, stop_day), 0.0)
+        profile.append({
+            "stop": stop,
+            "crs": gazetteer.tiploc_to_crs.get(stop),
+            "minutes_from_origin": round(offset, 1),
+            "hour": stop_hour,
+            "day_of_week": stop_day,
+            "predicted_delay_minutes": round(adjusted, 2),
+        })
+    return {"origin": origin, "destination": destination, "stops": profile}
+
 # main prediction function:
 def predict_delay_from_input(user_input, weather=None, journey_info=None):
     """Predict train delay based on user input with improved NLP extraction."""
-    from nlpprocessor import JourneyExtractor
-
-    extractor = JourneyExtractor(debug=False)  # Ensure debug is False
     if journey_info is None:
-        journey_info = extractor.extract_journey_details(user_input)
+        journey_info = get_journey_extractor().extract_journey_details(user_input)
     
     if not journey_info or "origin" not in journey_info or "destination" not in journey_info:
         return ("Sorry, I couldn't extract your train journey details.\n"
@@ -92,11 +261,7 @@ def predict_delay_from_input(user_input, weather=None, journey_info=None):
     
     # Get day from journey info or default to Friday
     day_str = journey_info.get("departure_day", "Friday")
-    day_mapping = {
-        "Monday": 0, "Tuesday": 1, "Wednesday": 2,
-        "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6
-    }
-    day_of_week = day_mapping.get(day_str, 4)  # Default to Friday (4)
+    day_of_week = DAY_MAPPING.get(day_str, 4)  # Default to Friday (4)
     
     # Create a synthetic query with all information for prediction
     synthetic_query = f"from {journey_info['origin']} to {journey_info['destination']}"
@@ -114,44 +279,17 @@ def predict_delay_from_input(user_input, weather=None, journey_info=None):
     
     # Get station deviation - AVOID USING PRINT FOR DEBUG
     try:
-        # Instead of checking for existence first, use get() with default
-        origin_id = station_to_id.get(origin, 0)
-        dest_id = station_to_id.get(destination, 0)
-        
-        if origin_id == 0 or dest_id == 0:
-            # Use a fallback estimation but DON'T print the debug message
-            station_deviation = 5  # Some reasonable default
-        else:
-            station_deviation = abs(origin_id - dest_id)
-            
-        peak = is_peak(hour)
-        
-        features = np.array([[station_deviation, day_of_week, hour, peak]])
+        bundle = registry.active()
+        features = np.array([journey_feature_row(origin, destination, hour, day_of_week, bundle.features)])
         
-        # Suppress scikit-learn warnings
-        import warnings
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            # Make prediction
-            prediction = model.predict(features)[0]
+        # Make prediction (the registry bundle suppresses scikit-learn warnings)
+        prediction = bundle.predict(features)[0]
         
         # Apply adjustments
         if weather is None:
             weather = get_random_weather()
             
-        adjustment = 0
-        if weather in {"heavy rain", "heavy snow", "thunderstorm", "stormy"}:
-            adjustment += 5
-        elif weather in {"sunny", "clear"}:
-            adjustment -= 2
-            
-        if is_rush_hour(hour):
-            adjustment += 3
-            
-        if day_of_week in (5, 6):  # Weekend adjustment
-            adjustment += 1
-            
-        adjusted = max(prediction + adjustment, 0)
+        adjusted = max(prediction + delay_adjustment(weather, hour, day_of_week), 0)
         minutes = int(adjusted)
         seconds = int(round((adjusted - minutes) * 60))
         
@@ -1,71 +1,304 @@
 # imports:
 import os
+import sys
+import time
+import random
+import pickle
+import argparse
+import threading
+import multiprocessing
 import pandas as pd
 import numpy as np
-import pickle
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.model_selection import train_test_split, TimeSeriesSplit, ParameterSampler
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor, HistGradientBoostingRegressor
+from sklearn.linear_model import Ridge
 from sklearn.metrics import mean_absolute_error
-from datetime import datetime
+from data_cache import load_training_frame
+from model_registry import ModelRegistry
+from resources import get_gazetteer, get_spatial_index
+from spatial import UNKNOWN_DISTANCE_KM
 
 # set up absolute path to dataFile.txt:
 data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataFile.txt"))
+model_dir = os.path.join(os.path.dirname(__file__), "ml_model")
 
-# load dataset:
-df = pd.read_csv(data_path, header=None, names=["origin", "destination", "scheduled", "actual", "date"])
+# define features and label:
+features = [
+    "distance_km", "origin_lat", "origin_lon", "destination_lat", "destination_lon",
+    "day_of_week", "hour", "on_peak",
+]
+label = "delay_minutes"
 
-# remove any missing data:
-df.dropna(inplace=True)
+# estimator families and the parameter space searched for each:
+SEARCH_SPACE = {
+    "random_forest": (RandomForestRegressor, {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [None, 6, 10, 16],
+        "min_samples_leaf": [1, 5, 20],
+        "random_state": [42],
+    }),
+    "extra_trees": (ExtraTreesRegressor, {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [None, 6, 10, 16],
+        "min_samples_leaf": [1, 5, 20],
+        "random_state": [42],
+    }),
+    "hist_gradient_boosting": (HistGradientBoostingRegressor, {
+        "loss": ["absolute_error", "squared_error"],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_iter": [100, 200],
+        "max_leaf_nodes": [15, 31, 63],
+        "random_state": [42],
+    }),
+    "ridge": (Ridge, {
+        "alpha": [0.1, 1.0, 10.0],
+    }),
+}
 
-# remove rows with blank station codes:
-df = df[(df["origin"].str.strip() != "") & (df["destination"].str.strip() != "")]
+LEADERBOARD_COLUMNS = [
+    "rank", "family", "params", "mae", "mae_std", "fit_time_s",
+    "model_size_bytes", "predict_latency_ms", "status",
+]
 
-# convert to datetime:
-df["sched_dt"] = pd.to_datetime(df["date"] + " " + df["scheduled"], errors="coerce")
-df["actual_dt"] = pd.to_datetime(df["date"] + " " + df["actual"], errors="coerce")
 
-# remove rows with failed datetime parsing:
-df.dropna(subset=["sched_dt", "actual_dt"], inplace=True)
+# load and clean the dataset, reusing the parsed binary cache next to the source when it is still valid:
+def load_dataset(path=data_path, use_cache=True):
+    return load_training_frame(path, use_cache=use_cache)
 
-# calculate delay in minutes:
-df["delay_minutes"] = (df["actual_dt"] - df["sched_dt"]).dt.total_seconds() / 60.0
 
-# build station id map from origin and destination columns:
-all_stations = pd.concat([df["origin"], df["destination"]]).unique()
-station_ids = {station: i for i, station in enumerate(all_stations)}
-df["origin_id"] = df["origin"].map(station_ids)
-df["dest_id"] = df["destination"].map(station_ids)
-df["station_deviation"] = abs(df["origin_id"] - df["dest_id"])
+# add model features to the cleaned dataset:
+def build_features(df):
+    origin = df["origin"].astype(str)
+    destination = df["destination"].astype(str)
+    all_stations = pd.concat([origin, destination]).unique()
 
-# extract hour and day of week:
-df["hour"] = df["sched_dt"].dt.hour
-df["day_of_week"] = df["sched_dt"].dt.weekday
+    # station coordinates and the great-circle distance between them from the precomputed matrix
+    # (TIPLOCs resolved to CRS codes through the gazetteer):
+    gazetteer, spatial_index = get_gazetteer(), get_spatial_index()
+    crs = {station: gazetteer.resolve(station) for station in all_stations}
+    origin_crs, destination_crs = origin.map(crs), destination.map(crs)
+    df["distance_km"] = spatial_index.distances_km(origin_crs, destination_crs, unknown=UNKNOWN_DISTANCE_KM)
+    df["origin_lat"], df["origin_lon"] = spatial_index.coordinates(origin_crs)
+    df["destination_lat"], df["destination_lon"] = spatial_index.coordinates(destination_crs)
 
-# rush hour feature:
-df["on_peak"] = df["hour"].apply(lambda x: 1 if 7 <= x <= 9 or 17 <= x <= 19 else 0)
+    # extract hour and day of week:
+    df["hour"] = df["sched_dt"].dt.hour
+    df["day_of_week"] = df["sched_dt"].dt.weekday
 
-# define features and label:
-features = ["station_deviation", "day_of_week", "hour", "on_peak"]
-X = df[features]
-y = df["delay_minutes"]
+    # rush hour feature:
+    df["on_peak"] = df["hour"].apply(lambda x: 1 if 7 <= x <= 9 or 17 <= x <= 19 else 0)
+    return df
 
-# split into training and testing sets:
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# train the model:
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+# publish a fitted model as a new registry version, running servers pick it up without a restart:
+def save_model(model, meta=None, activate=True):
+    registry = ModelRegistry(model_dir)
+    version = registry.publish(model, meta=dict(meta or {}, features=features), activate=activate)
+    return version, os.path.join(registry.versions_dir, version)
 
-# evaluate model performance:
-y_pred = model.predict(X_test)
-print("mae:", mean_absolute_error(y_test, y_pred))
 
-# save the model:
-model_dir = os.path.join(os.path.dirname(__file__), "ml_model")
-os.makedirs(model_dir, exist_ok=True)
+# default mode: one split, one fit with fixed parameters:
+def train_default(df, activate=True):
+    X = df[features]
+    y = df[label]
+
+    # split into training and testing sets:
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # train the model:
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+
+    # evaluate model performance:
+    y_pred = model.predict(X_test)
+    mae = mean_absolute_error(y_test, y_pred)
+    print("mae:", mae)
+
+    # save the model:
+    version, path = save_model(model, meta={"mae": mae, "estimator": type(model).__name__}, activate=activate)
+    print(f"model version {version} saved to {path}" + ("" if activate else " (not activated)"))
+
+
+# --- hyperparameter search ---
+# each candidate runs in a process of its own, which receives the training matrix when it starts:
+_search_X = None
+_search_y = None
+_search_folds = None
+
+
+def _search_process(connection, X, y, folds, family, params):
+    """Body of one candidate's process: evaluate it and send the result back over `connection`."""
+    global _search_X, _search_y, _search_folds
+    _search_X, _search_y, _search_folds = X, y, folds
+    try:
+        result = _evaluate_candidate(family, params)
+    except Exception as e:
+        result = {"family": family, "params": params, "status": f"error: {e}"}
+    connection.send(result)
+    connection.close()
+
+
+def _measure_predict_latency(model, X, repeats=50):
+    """Median wall time in ms of a single-row predict, the shape the chatbot serves."""
+    row = X[:1]
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000.0
+
+
+def _evaluate_candidate(family, params):
+    """Cross-validate one candidate over the time-ordered folds and fit it on the full data."""
+    estimator_cls = SEARCH_SPACE[family][0]
+    fold_maes = []
+    fit_time = 0.0
+    for train_idx, test_idx in _search_folds:
+        model = estimator_cls(**params)
+        start = time.perf_counter()
+        model.fit(_search_X[train_idx], _search_y[train_idx])
+        fit_time += time.perf_counter() - start
+        fold_maes.append(mean_absolute_error(_search_y[test_idx], model.predict(_search_X[test_idx])))
+
+    # the serving cost is measured on the model that would actually be deployed:
+    model = estimator_cls(**params)
+    model.fit(_search_X, _search_y)
+    return {
+        "family": family,
+        "params": params,
+        "mae": float(np.mean(fold_maes)),
+        "mae_std": float(np.std(fold_maes)),
+        "fit_time_s": fit_time / len(fold_maes),
+        "model_size_bytes": len(pickle.dumps(model)),
+        "predict_latency_ms": _measure_predict_latency(model, _search_X),
+        "status": "ok",
+    }
+
+
+def sample_candidates(families, max_candidates, seed=42):
+    """Draw a bounded, reproducible set of (family, params) pairs spread across families."""
+    per_family = max(1, max_candidates // len(families))
+    candidates = []
+    for family in families:
+        params_grid = SEARCH_SPACE[family][1]
+        candidates.extend((family, params) for params in ParameterSampler(params_grid, n_iter=per_family, random_state=seed))
+    random.Random(seed).shuffle(candidates)
+    return candidates[:max_candidates]
+
+
+def run_search(df, families=None, max_candidates=24, n_splits=5, budget_s=600.0, workers=None, leaderboard_path=None):
+    """Time-aware cross-validated search over estimator families, `workers` candidates at a time.
+
+    Every candidate runs in its own process. When the wall-clock budget runs
+    out, queued candidates are cancelled and running ones are terminated; both
+    are recorded on the leaderboard with status "timeout".
+    """
+    families = families or list(SEARCH_SPACE)
+    leaderboard_path = leaderboard_path or os.path.join(model_dir, "leaderboard.csv")
+
+    # folds must only ever train on the past and test on the future:
+    df = df.sort_values("sched_dt")
+    X = df[features].to_numpy(dtype=np.float64)
+    y = df[label].to_numpy(dtype=np.float64)
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+
+    candidates = sample_candidates(families, max_candidates)
+    print(f"searching {len(candidates)} candidates over {families} with {n_splits} time-ordered folds "
+          f"(budget {budget_s:.0f}s)")
+
+    context = multiprocessing.get_context()
+    running = {}    # candidate index -> its process, so the budget can stop it
+    running_lock = threading.Lock()
+    out_of_budget = threading.Event()
+
+    def evaluate(index, family, params):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_search_process, args=(sender, X, y, folds, family, params), daemon=True)
+        with running_lock:
+            if out_of_budget.is_set():
+                return {"family": family, "params": params, "status": "timeout"}
+            process.start()
+            running[index] = process
+        sender.close()
+        try:
+            return receiver.recv()
+        except EOFError:
+            # terminated when the budget ran out
+            return {"family": family, "params": params, "status": "timeout"}
+        finally:
+            receiver.close()
+            process.join()
+            with running_lock:
+                running.pop(index, None)
+
+    results = []
+    deadline = time.monotonic() + budget_s
+    # the threads only start candidate processes and wait for them, so one per candidate evaluated at once:
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        pending = {pool.submit(evaluate, index, family, params): (family, params)
+                   for index, (family, params) in enumerate(candidates)}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                family, params = pending.pop(future)
+                result = future.result()
+                results.append(result)
+                print(f"  {family:<24} mae={result.get('mae', float('nan')):.4f} {params}")
+
+        if pending:
+            # out of budget: drop the candidates that have not started and stop the ones running,
+            # so leaving the block does not wait for them
+            pool.shutdown(wait=False, cancel_futures=True)
+            with running_lock:
+                out_of_budget.set()
+                for process in running.values():
+                    process.terminate()
+        for family, params in pending.values():
+            results.append({"family": family, "params": params, "status": "timeout"})
+
+    leaderboard = pd.DataFrame(results).reindex(columns=LEADERBOARD_COLUMNS[1:])
+    leaderboard.sort_values(["mae", "predict_latency_ms"], inplace=True, na_position="last")
+    leaderboard.insert(0, "rank", range(1, len(leaderboard) + 1))
+    leaderboard["params"] = leaderboard["params"].astype(str)
+
+    os.makedirs(os.path.dirname(leaderboard_path), exist_ok=True)
+    leaderboard.to_csv(leaderboard_path, index=False)
+    print(leaderboard.head(10).to_string(index=False))
+    print("leaderboard saved to", leaderboard_path)
+    return leaderboard
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the train delay model.")
+    parser.add_argument("--search", action="store_true",
+                        help="run cross-validated hyperparameter search instead of a single fit")
+    parser.add_argument("--families", nargs="+", choices=list(SEARCH_SPACE), default=None,
+                        help="estimator families to search (default: all)")
+    parser.add_argument("--max-candidates", type=int, default=24, help="upper bound on candidates evaluated")
+    parser.add_argument("--folds", type=int, default=5, help="number of time-ordered CV folds")
+    parser.add_argument("--budget", type=float, default=600.0, help="wall-clock budget for the search in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="candidates evaluated at once, each in its own process (default: cpu count)")
+    parser.add_argument("--leaderboard", default=None, help="where to write the leaderboard csv")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="publish the trained model without making it the active version")
+    parser.add_argument("--no-cache", action="store_true", help="parse dataFile.txt from scratch and skip the binary cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = build_features(load_dataset(use_cache=not args.no_cache))
+    if args.search:
+        run_search(df, families=args.families, max_candidates=args.max_candidates, n_splits=args.folds,
+                   budget_s=args.budget, workers=args.workers, leaderboard_path=args.leaderboard)
+    else:
+        train_default(df, activate=not args.no_activate)
 
-model_path = os.path.join(model_dir, "model.pkl")
-with open(model_path, "wb") as file:
-    pickle.dump(model, file)
 
-print("model saved to", model_path)
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+# imports:
+import time
+import threading
+from resources import get_journey_extractor
+
+RUSH_HOURS = {f"{hour:02d}" for hour in list(range(7, 11)) + list(range(16, 20))}
+WEEKEND_DAYS = {"saturday", "sunday"}
+
+
+class StageStats:
+    """Running totals of time spent per pipeline stage, shared by all request threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+
+    def record(self, timings):
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": self.counts[stage],
+                    "total_ms": round(self.totals[stage] * 1000, 3),
+                    "mean_ms": round(self.totals[stage] * 1000 / self.counts[stage], 3),
+                }
+                for stage in self.totals
+            }
+
+
+stage_stats = StageStats()
+
+
+class ParsedTurn:
+    """Everything derived from one user message, computed once and shared by every handler.
+
+    The cheap parts (normalised text, intent, ticket keywords, day and rush-hour
+    mentions) are computed up front. Journey extraction runs the regex and
+    fuzzy station matching, so it only happens the first time `journey` is read.
+    """
+
+    def __init__(self, user_input):
+        self.timings = {}
+        start = time.perf_counter()
+        self.text = user_input or ""
+        self.stripped = self.text.strip()
+        self.lower = self.text.lower()
+        self.normalised = self.stripped.lower()
+        self.upper = self.stripped.upper()
+        self._journey = None
+        self._mark("normalise", start)
+
+        start = time.perf_counter()
+        self.ticket_fields = self._ticket_fields()
+        self.mentions_weekend = any(day in self.lower for day in WEEKEND_DAYS)
+        self.mentions_rush_hour = any(rh in self.text for rh in RUSH_HOURS)
+        self._mark("keywords", start)
+
+        self.intent = None
+
+    def _mark(self, stage, start):
+        self.timings[stage] = self.timings.get(stage, 0.0) + (time.perf_counter() - start)
+
+    def _ticket_fields(self):
+        lower = self.lower
+        fields = {}
+        # Ticket type
+        if "single" in lower or "one way" in lower:
+            fields["ticket_type"] = "SINGLE"
+        elif "return" in lower or "round trip" in lower:
+            fields["ticket_type"] = "RETURN"
+        # Ticket time
+        if "off-peak" in lower or "off peak" in lower:
+            fields["ticket_time"] = "OFF-PEAK"
+        elif "anytime" in lower or "any time" in lower:
+            fields["ticket_time"] = "ANYTIME"
+        # Ticket age
+        if "adult" in lower:
+            fields["ticket_age"] = "ADULT"
+        elif "child" in lower or "kid" in lower:
+            fields["ticket_age"] = "CHILD"
+        return fields
+
+    def classify(self, match_intent):
+        """Run the intent matcher once over the normalised text."""
+        start = time.perf_counter()
+        self.intent = match_intent(self.lower)
+        self._mark("intent", start)
+        return self.intent
+
+    @property
+    def journey(self):
+        """Origin/destination/time/day extracted from this message (extracted at most once)."""
+        if self._journey is None:
+            start = time.perf_counter()
+            self._journey = get_journey_extractor().extract_journey_details(self.text)
+            self._mark("journey", start)
+        return self._journey
+
+    def finish(self, stage="respond", start=None):
+        """Record the time spent answering and fold this turn's timings into the shared stats."""
+        if start is not None:
+            self._mark(stage, start)
+        stage_stats.record(self.timings)
+        return self.timings
+
+
+def parse_turn(user_input):
+    return ParsedTurn(user_input)